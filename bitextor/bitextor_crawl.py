@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Crawler of many hosts at once, in a single process: every host is crawled by a coroutine that fetches its pages one
+# at a time, waiting between requests as much as requested by --wait and by the Crawl-delay of its robots.txt, while
+# up to --concurrency hosts are crawled concurrently. Responses are written to a gzipped WARC per host as soon as they
+# are downloaded.
+
+import argparse
+import asyncio
+import html
+import io
+import logging
+import os
+import re
+import ssl
+import time
+import urllib.robotparser
+from collections import deque, Counter
+from urllib.parse import urlsplit, urljoin, urldefrag, quote
+
+from warcio.statusandheaders import StatusAndHeaders, StatusAndHeadersParser, StatusAndHeadersParserException
+from warcio.warcwriter import WARCWriter
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (compatible; Bitextor; +https://github.com/bitextor/bitextor)"
+
+LINK_RE = re.compile(rb"""<(?:a|area|frame|iframe)\b[^>]*?\b(?:href|src)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""",
+                     flags=re.IGNORECASE)
+
+REDIRECT_STATUSES = frozenset(["301", "302", "303", "307", "308"])
+
+# Redirections followed when fetching robots.txt, as in RFC 9309
+MAX_ROBOTS_REDIRECTS = 5
+
+# Extensions of dynamic pages, which are HTML documents
+PAGE_EXTENSIONS = frozenset(["htm", "html", "xhtml", "shtml", "php", "asp", "aspx", "jsp", "cgi"])
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+HTTP_HEADER_PARSER = StatusAndHeadersParser(["HTTP/1.0", "HTTP/1.1"])
+
+
+def ssl_context(check_certificate=True):
+    """
+    SSL context of the HTTPS connections, which verifies the certificates of the hosts unless check_certificate is
+    false
+    """
+    context = ssl.create_default_context()
+    if not check_certificate:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def host_name(parts):
+    """
+    Host of a split URL, with its port unless it is the default one
+    """
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port not in (80, 443):
+        host += f":{parts.port}"
+    return host
+
+
+def parse_duration(duration):
+    """
+    Parse a duration like the ones of the timeout command: a number followed by s, m, h, d or w (seconds by default)
+    """
+    if duration[-1] in DURATION_UNITS:
+        return float(duration[:-1]) * DURATION_UNITS[duration[-1]]
+    return float(duration)
+
+
+async def read_body(reader, headers, max_size):
+    """
+    Read the body of an HTTP response, decoding the chunked transfer encoding
+    """
+    transfer_encoding = headers.get_header("Transfer-Encoding")
+    if transfer_encoding and "chunked" in transfer_encoding.lower():
+        chunks = []
+        size = 0
+        while True:
+            line = await reader.readline()
+            chunk_size = int(line.split(b";")[0].strip() or b"0", 16)
+            if chunk_size == 0:
+                # trailers
+                while (await reader.readline()).strip():
+                    pass
+                break
+            size += chunk_size
+            if max_size and size > max_size:
+                raise BodyTooLarge()
+            chunks.append(await reader.readexactly(chunk_size))
+            await reader.readline()
+        return b"".join(chunks)
+
+    content_length = headers.get_header("Content-Length")
+    if content_length is not None and content_length.strip().isdigit():
+        length = int(content_length)
+        if max_size and length > max_size:
+            raise BodyTooLarge()
+        return await reader.readexactly(length)
+
+    body = await reader.read(max_size + 1 if max_size else -1)
+    if max_size and len(body) > max_size:
+        raise BodyTooLarge()
+    return body
+
+
+async def fetch(url, agent, max_size, context):
+    """
+    GET a URL. Returns the status and headers of the response and its body
+    """
+    parts = urlsplit(url)
+    https = parts.scheme == "https"
+    path = quote(parts.path or "/", safe="/%:@!$&'()*+,;=~-._")
+    if parts.query:
+        path += "?" + quote(parts.query, safe="/%:@!$&'()*+,;=~-._?")
+
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or (443 if https else 80),
+                                                   ssl=context if https else None)
+    try:
+        request = (f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nUser-Agent: {agent}\r\nAccept: */*\r\n"
+                   f"Accept-Encoding: identity\r\nConnection: close\r\n\r\n")
+        writer.write(request.encode("latin-1", errors="replace"))
+        await writer.drain()
+
+        head = await reader.readuntil(b"\r\n\r\n")
+        headers = HTTP_HEADER_PARSER.parse(io.BytesIO(head))
+        if headers.get_statuscode() in ("204", "304") or headers.get_statuscode().startswith("1"):
+            body = b""
+        else:
+            body = await read_body(reader, headers, max_size)
+    finally:
+        writer.close()
+    return headers, body
+
+
+class HostCrawler(object):
+    """
+    Crawl of the pages of a host, written to a WARC
+    """
+
+    def __init__(self, host, warc_writer, options):
+        self.host = host.lower()
+        self.writer = warc_writer
+        self.agent = options.agent
+        self.timeout = options.timeout
+        self.max_size = options.maxSize
+        self.ssl_context = ssl_context(options.checkCertificate)
+        self.wait = float(options.wait) if options.wait else 0
+        self.filetypes = frozenset(options.filetypes.lower().split(",")) if options.filetypes else None
+        if self.filetypes and "html" in self.filetypes:
+            self.filetypes = self.filetypes | PAGE_EXTENSIONS
+        self.robots = None
+        self.queue = deque()
+        self.seen = set()
+        self.last_request = 0
+        self.stats = Counter()
+
+    async def get(self, url):
+        """
+        Fetch a URL, waiting since the previous request as much as required. Returns None if it could not be fetched
+        """
+        delay = self.last_request + self.wait - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.last_request = time.monotonic()
+        self.stats["requests"] += 1
+        try:
+            return await asyncio.wait_for(fetch(url, self.agent, self.max_size, self.ssl_context), self.timeout)
+        except BodyTooLarge:
+            logging.info(f"Skipping {url}: over {self.max_size} bytes")
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                StatusAndHeadersParserException, ValueError) as ex:
+            logging.info(f"Error fetching {url}: {ex!r}")
+        self.stats["errors"] += 1
+        return None
+
+    async def start(self):
+        """
+        Find out the scheme of the host, trying HTTP and then HTTPS, and read its robots.txt. Returns the URL of the
+        home page, or None if the host cannot be reached
+        """
+        for scheme in ("http", "https"):
+            base = f"{scheme}://{self.host}"
+            response = await self.get_robots(base + "/robots.txt")
+            if response is not None:
+                break
+        else:
+            return None
+
+        url, headers, body = response
+        # the host may redirect to HTTPS, and then its home page is requested with that scheme too
+        parts = urlsplit(url)
+        if parts.scheme in ("http", "https") and host_name(parts) == self.host:
+            base = f"{parts.scheme}://{self.host}"
+        self.robots = urllib.robotparser.RobotFileParser()
+        status = headers.get_statuscode()
+        if status in ("401", "403"):
+            self.robots.disallow_all = True
+        elif status == "200":
+            self.robots.parse(body.decode("utf-8", errors="replace").splitlines())
+        else:
+            self.robots.allow_all = True
+
+        crawl_delay = self.robots.crawl_delay(self.agent) if status == "200" else None
+        if crawl_delay is not None and float(crawl_delay) > self.wait:
+            self.wait = float(crawl_delay)
+        return base + "/"
+
+    async def get_robots(self, url):
+        """
+        Fetch robots.txt following its redirections. Returns the final URL, headers and body, or None if the host
+        cannot be reached
+        """
+        for _ in range(MAX_ROBOTS_REDIRECTS):
+            response = await self.get(url)
+            if response is None:
+                return None
+            headers, body = response
+            location = headers.get_header("Location")
+            if headers.get_statuscode() not in REDIRECT_STATUSES or not location:
+                break
+            try:
+                url = urljoin(url, location.strip())
+            except ValueError as ex:
+                logging.info(f"Invalid redirection of {url}: {ex!r}")
+                break
+        return url, headers, body
+
+    def in_scope(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or host_name(parts) != self.host:
+            return False
+        if self.filetypes:
+            name = parts.path.rsplit("/", 1)[-1]
+            if "." in name and name.rsplit(".", 1)[1].lower() not in self.filetypes:
+                return False
+        return self.robots.can_fetch(self.agent, url)
+
+    def add(self, base, link):
+        """
+        Queue the URL of a link found in base if it has not been seen and it is in scope. Invalid URLs are skipped
+        """
+        try:
+            url = urldefrag(urljoin(base, link))[0]
+            if url in self.seen or not self.in_scope(url):
+                return
+        except ValueError as ex:
+            logging.info(f"Skipping link {link!r} of {base}: {ex!r}")
+            return
+        self.seen.add(url)
+        self.queue.append(url)
+
+    def links(self, headers, body):
+        content_type = headers.get_header("Content-Type") or ""
+        if "html" not in content_type.lower():
+            return
+        for match in LINK_RE.finditer(body):
+            link = match.group(1) or match.group(2) or match.group(3)
+            link = html.unescape(link.decode("utf-8", errors="replace")).strip()
+            if link and not link.startswith(("#", "javascript:", "mailto:", "tel:", "data:")):
+                yield link
+
+    def write(self, url, headers, body):
+        # the body is written without the transfer encoding
+        headers.remove_header("Transfer-Encoding")
+        try:
+            headers.to_ascii_bytes()
+        except UnicodeEncodeError:
+            # if header is non ascii, create a new header, with status code only
+            headers = StatusAndHeaders(headers.get_statuscode(), [], protocol=headers.protocol)
+        record = self.writer.create_warc_record(url, "response", payload=io.BytesIO(body), http_headers=headers)
+        self.writer.write_record(record)
+        self.stats["records"] += 1
+        self.stats["bytes"] += len(body)
+
+    async def run(self):
+        home = await self.start()
+        if home is None:
+            logging.info(f"Host {self.host} could not be reached")
+            return
+        self.seen.add(home)
+        self.queue.append(home)
+
+        while self.queue:
+            url = self.queue.popleft()
+            response = await self.get(url)
+            if response is None:
+                continue
+            headers, body = response
+            self.write(url, headers, body)
+
+            if headers.get_statuscode() in REDIRECT_STATUSES and headers.get_header("Location"):
+                self.add(url, headers.get_header("Location").strip())
+            for link in self.links(headers, body):
+                self.add(url, link)
+
+
+async def crawl_host(host, options, semaphore, stats):
+    folder = os.path.join(options.outputDir, host)
+    os.makedirs(folder, exist_ok=True)
+    # the WARC is created, and left empty, even if the host cannot be crawled
+    with open(os.path.join(folder, options.outputName), "wb") as f:
+        async with semaphore:
+            logging.info(f"Crawling {host}")
+            writer = WARCWriter(f, gzip=True)
+            writer.write_record(writer.create_warcinfo_record(
+                filename=options.outputName,
+                info={
+                    'software': 'bitextor/bitextor_crawl.py',
+                    'format': 'WARC File Format 1.0',
+                    'http-header-user-agent': options.agent,
+                    'robots': 'obey',
+                    'check-certificate': 'yes' if options.checkCertificate else 'no'}))
+            crawler = HostCrawler(host, writer, options)
+            try:
+                await asyncio.wait_for(crawler.run(), options.timeLimit)
+            except asyncio.TimeoutError:
+                logging.info(f"Time limit reached for {host}")
+            logging.info(f"Finished {host}: {crawler.stats['records']} records, {crawler.stats['errors']} errors")
+            stats.update(crawler.stats)
+
+
+async def crawl(hosts, options):
+    semaphore = asyncio.Semaphore(options.concurrency)
+    stats = Counter()
+    start = time.perf_counter()
+    await asyncio.gather(*(crawl_host(host, options, semaphore, stats) for host in hosts))
+    seconds = time.perf_counter() - start
+    logging.info(f"{len(hosts)} hosts, {stats['records']} records ({stats['bytes'] / 1e6:.1f} MB) in {seconds:.1f}s: "
+                 f"{stats['records'] / max(seconds, 1e-9):.1f} records/s, {stats['errors']} errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Crawl several hosts concurrently, honouring their robots.txt, and write a gzipped WARC per host")
+    parser.add_argument('hosts', nargs='*', help='Hosts to crawl')
+    parser.add_argument('--hosts-file', dest='hostsFile', default=None, help='File with a host to crawl per line')
+    parser.add_argument('--output-dir', dest='outputDir', required=True,
+                        help='Directory where the WARC of every host is written, in a subdirectory with its name')
+    parser.add_argument('--output-name', dest='outputName', default="crawl.warc.gz",
+                        help='Name of the WARC of every host')
+    parser.add_argument('--concurrency', type=int, default=16, help='Maximum number of hosts crawled at once')
+    parser.add_argument('-t', dest='timeLimit', type=parse_duration, default=None,
+                        help='Maximum time to crawl a host, e.g. 3600, 60m or 1h')
+    parser.add_argument('-a', dest='agent', default=DEFAULT_USER_AGENT,
+                        help='User agent to be included in the crawler requests')
+    parser.add_argument('-f', dest='filetypes', default=None,
+                        help='File types to be downloaded, comma separated. For example, "html,pdf"')
+    parser.add_argument('--wait', dest='wait', default=None,
+                        help='Wait N seconds between requests to the same host')
+    parser.add_argument('--timeout', type=float, default=30, help='Timeout of every request in seconds')
+    parser.add_argument('--max-size', dest='maxSize', type=int, default=0,
+                        help='Responses larger than this size in bytes are discarded; 0 for no limit')
+    parser.add_argument('--no-check-certificate', dest='checkCertificate', action='store_false', default=True,
+                        help="Do not verify the certificates of HTTPS hosts; this is recorded in the warcinfo record "
+                             "of every WARC")
+    parser.add_argument('-v', '--verbose', action='store_true', default=False)
+    options = parser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s %(levelname)-8s %(message)s',
+        level=logging.INFO if options.verbose else logging.ERROR,
+        datefmt='%Y-%m-%d %H:%M:%S')
+
+    hosts = list(options.hosts)
+    if options.hostsFile:
+        with open(options.hostsFile) as f:
+            hosts.extend(line.strip() for line in f if line.strip())
+    # hosts can be given as URLs too
+    names = []
+    for host in hosts:
+        try:
+            names.append(host_name(urlsplit(host)) if "//" in host else host.lower())
+        except ValueError as ex:
+            logging.error(f"Skipping host {host!r}: {ex!r}")
+    hosts = list(dict.fromkeys(names))
+
+    asyncio.run(crawl(hosts, options))
+
+
+if __name__ == "__main__":
+    main()
@@ -19,100 +19,149 @@ import sys
 import os
 import argparse
 import base64
-import string
+import logging
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 
 from sentence_splitter import SentenceSplitter, SentenceSplitterException
 
 from bitextor.utils.common import open_xz_or_gzip_or_plain
-from bitextor.utils.common import ExternalTextProcessor
+from bitextor.utils.common import ExternalTextProcessor, PersistentTextProcessor
+from bitextor.utils.common import batched, bounded_imap
+from bitextor.utils.sentence_filter import SentenceFilter, report
 
 
-# True -> keep sentence
-# False -> throw away
-def filter_trash(sentence):
-    digits_and_punctuation = string.punctuation + string.digits
-    n = 0
-    for c in sentence:
-        if c == "\x00":
-            return False
-        if c in digits_and_punctuation:
-            n = n + 1
-    return n < len(sentence) // 2
-
-
-def split_external(text, external_splitter, prune_type="words", prune_threshold=0):
-    output, error_output, returncode = external_splitter.process(content)
+def split_external(text, external_splitter):
+    output, error_output, returncode = external_splitter.process(text)
     if returncode != 0:
         print(f"External sentence splitter existed with non-zero code: {returncode}", file=sys.stderr)
         print(error_output.strip(), file=sys.stderr)
         sys.exit(1)
 
-    segments = output.strip().split("\n")
-    # prune long sentences
-    if prune_threshold and prune_type == "words":
-        segments = [s for s in segments if not len(s.split()) > prune_threshold]
-    elif prune_threshold and prune_type == "chars":
-        segments = [s for s in segments if not len(s) > prune_threshold]
-
-    segments = [s for s in segments if filter_trash(s)]
-
-    segmented_text = "\n".join(segments) + "\n"
-    return segmented_text
-
-
-def split_moses(text, moses_splitter, prune_type="words", prune_threshold=0):
-    segments = moses_splitter.split(content)
-
-    # prune long sentences
-    if prune_threshold and prune_type == "words":
-        segments = [s for s in segments if not len(s.split()) > prune_threshold]
-    elif prune_threshold and prune_type == "chars":
-        segments = [s for s in segments if not len(s) > prune_threshold]
-
-    segments = [s for s in segments if filter_trash(s)]
-
-    segmented_text = "\n".join(segments) + "\n"
-    return segmented_text
-
-
-oparser = argparse.ArgumentParser(description="Tool that does sentence splitting on plain text")
-oparser.add_argument('--text', dest='text', help='Plain text file', default="-")
-oparser.add_argument('--sentence-splitter', dest='splitter', default=None, help="Sentence splitter command line. "
-                     "If not provided, Moses split_sentences Python port will be used.")
-oparser.add_argument('--langcode', dest='langcode', default="en",
-                     help="Language code for default sentence splitter and tokenizer")
-oparser.add_argument('--customnbp', dest='customnbp',
-                     help="Path for custom non breaking prefixes used by Moses Sentence Splitter Python port")
-oparser.add_argument('--sentences-output', default="plain_sentences.xz", dest='sent_output',
-                     help="Path of the output file that will contain sentence splitted text")
-oparser.add_argument("--prune", dest="prune_threshold", type=int, default=0,
-                     help="Prune sentences longer than n (words/characters)", required=False)
-oparser.add_argument("--prune-type", dest="prune_type", choices={"words", "chars"}, default="words",
-                     help="Prune sentences either by words or characters", required=False)
-
-options = oparser.parse_args()
-
-splitter = options.splitter
-splitter_func = None
-# no sentence splitter command provided, use moses:
-if not splitter:
-    splitter_func = split_moses
-    try:
-        if options.customnbp:
-            splitter = SentenceSplitter(language=options.langcode, non_breaking_prefix_file=options.customnbp)
+    return output.strip().split("\n")
+
+
+def split_moses(text, moses_splitter):
+    return moses_splitter.split(text)
+
+
+# process that splits documents (the main one or each worker)
+splitter = None
+
+
+def init_splitter(config):
+    global splitter
+    splitter = dict(config)
+    # pruning of long sentences and trash filter
+    splitter["filter"] = SentenceFilter(config["prune_type"], config["prune_threshold"])
+
+    # no sentence splitter command provided, use moses:
+    if not config["splitter"]:
+        splitter["func"] = split_moses
+        try:
+            if config["customnbp"]:
+                splitter["splitter"] = SentenceSplitter(language=config["langcode"],
+                                                        non_breaking_prefix_file=config["customnbp"])
+            else:
+                splitter["splitter"] = SentenceSplitter(language=config["langcode"])
+        except SentenceSplitterException as e:
+            sys.stderr.write(str(e) + "\n")
+            splitter["splitter"] = SentenceSplitter(language='en')
+
+    # use custom sentence splitter, either as a single process that splits all the documents or via
+    # ExternalTextProcessor, which starts a process per document (inefficient):
+    else:
+        splitter["func"] = split_external
+        command = os.path.expanduser(config["splitter"]).split()
+        if config["persistent"]:
+            splitter["splitter"] = PersistentTextProcessor(command, timeout=config["timeout"])
         else:
-            splitter = SentenceSplitter(language=options.langcode)
-    except SentenceSplitterException as e:
-        sys.stderr.write(str(e) + "\n")
-        splitter = SentenceSplitter(language='en')
-
-# use custom sentence splitter via ExternalTextProcessor (inefficient):
-else:
-    splitter_func = split_external
-    splitter = ExternalTextProcessor(os.path.expanduser(splitter).split())
-
-with open_xz_or_gzip_or_plain(options.text) if options.text != "-" else sys.stdin as reader:
-    for doc in reader:
+            splitter["splitter"] = ExternalTextProcessor(command)
+
+
+def split_batch(docs):
+    """
+    Sentence split a batch of base64-encoded documents. Returns the list of the base64-encoded sentences of every
+    document and the stats of the sentence filter
+    """
+    split = []
+    for doc in docs:
         content = base64.b64decode(doc.strip()).decode("utf-8").replace("\t", " ")
-        sentences = splitter_func(content, splitter, options.prune_type, options.prune_threshold)
-        print(base64.b64encode(sentences.encode("utf-8")).decode("utf-8"))
+        sentences = splitter["filter"](splitter["func"](content, splitter["splitter"]))
+        split.append(base64.b64encode(("\n".join(sentences) + "\n").encode("utf-8")).decode("utf-8"))
+    return split, splitter["filter"].pop_stats()
+
+
+def main():
+    oparser = argparse.ArgumentParser(description="Tool that does sentence splitting on plain text")
+    oparser.add_argument('--text', dest='text', help='Plain text file', default="-")
+    oparser.add_argument('--sentence-splitter', dest='splitter', default=None, help="Sentence splitter command line. "
+                         "If not provided, Moses split_sentences Python port will be used.")
+    oparser.add_argument('--persistent-splitter', dest='persistent', action='store_true', default=False,
+                         help="Run the sentence splitter command once, and send all the documents to it, instead of "
+                              "running it for every document. The command must process its input line by line, "
+                              "flushing its output, and copy lines with just '<BITEXTOR-DOCUMENT-END>' to its output")
+    oparser.add_argument('--splitter-timeout', dest='timeout', type=float, default=60,
+                         help="With --persistent-splitter, restart the sentence splitter if it does not write anything "
+                              "in this number of seconds while splitting a document")
+    oparser.add_argument('--langcode', dest='langcode', default="en",
+                         help="Language code for default sentence splitter and tokenizer")
+    oparser.add_argument('--customnbp', dest='customnbp',
+                         help="Path for custom non breaking prefixes used by Moses Sentence Splitter Python port")
+    oparser.add_argument('--sentences-output', default="plain_sentences.xz", dest='sent_output',
+                         help="Path of the output file that will contain sentence splitted text")
+    oparser.add_argument("--prune", dest="prune_threshold", type=int, default=0,
+                         help="Prune sentences longer than n (words/characters)", required=False)
+    oparser.add_argument("--prune-type", dest="prune_type", choices={"words", "chars"}, default="words",
+                         help="Prune sentences either by words or characters", required=False)
+    oparser.add_argument('--workers', dest='workers', type=int, default=1,
+                         help="Number of processes used to split the documents; documents are read and written, in "
+                              "the same order, by the main process")
+    oparser.add_argument('--batch-size', dest='batch_size', type=int, default=64,
+                         help="Number of documents sent at once to every worker")
+
+    oparser.add_argument('-v', '--verbose', action='store_true', default=False,
+                         help="Log the number of sentences dropped by every filter")
+
+    options = oparser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s %(levelname)-8s %(message)s',
+        level=logging.INFO if options.verbose else logging.ERROR,
+        datefmt='%Y-%m-%d %H:%M:%S')
+
+    config = {
+        "splitter": options.splitter,
+        "persistent": options.persistent,
+        "timeout": options.timeout,
+        "langcode": options.langcode,
+        "customnbp": options.customnbp,
+        "prune_type": options.prune_type,
+        "prune_threshold": options.prune_threshold,
+    }
+
+    with open_xz_or_gzip_or_plain(options.text) if options.text != "-" else sys.stdin as reader:
+        batches = batched(reader, options.batch_size)
+        executor = None
+        if options.workers > 1:
+            # the splitter is loaded once by every worker, which splits batches of documents
+            executor = ProcessPoolExecutor(max_workers=options.workers, initializer=init_splitter,
+                                           initargs=(config,))
+            results = bounded_imap(executor, split_batch, batches, window=options.workers * 2)
+        else:
+            init_splitter(config)
+            results = map(split_batch, batches)
+
+        stats = Counter()
+        for split, filter_stats in results:
+            sys.stdout.write("\n".join(split) + "\n")
+            stats.update(filter_stats)
+
+        if executor:
+            executor.shutdown()
+
+    report(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,70 +20,133 @@ import os
 import argparse
 import base64
 
-from mosestokenizer import MosesTokenizer
+import mosestokenizer
 
-from bitextor.utils.common import open_xz_or_gzip_or_plain
-from bitextor.utils.common import ExternalTextProcessor
+from bitextor.utils.common import open_xz_or_gzip_or_plain, batched
+from bitextor.utils.common import ExternalTextProcessor, PersistentTextProcessor, WORD_DOCUMENT_DELIMITER
 
 
-def tokenize_moses(text, word_tokeniser, morph_analyser):
-    sentences = text.split('\n')
-    tokenized_text = []
-    for sentence in sentences:
-        tokenized_text.append(" ".join(word_tokeniser(sentence)).strip())
+def moses_command(langcode):
+    """
+    Command line of the tokenizer.perl of mosestokenizer, with the same options used by mosestokenizer.MosesTokenizer
+    """
+    program = os.path.join(os.path.dirname(mosestokenizer.__file__), "tokenizer-v1.1.perl")
+    return ["perl", program, "-q", "-l", langcode, "-b", "-a"]
 
-    # don't do + "\n" because tokenized text ends with '' item
-    tokenized_text = "\n".join(tokenized_text)
 
-    if morph_analyser:
-        tokenized_text = morph_analyser.process(tokenized_text)
+class PythonTokenizer(object):
+    """
+    In-process port of tokenizer.perl (sacremoses), with the interface of ExternalTextProcessor
+    """
 
-    if tokenized_text == "":
-        tokenized_text = "\n"
+    def __init__(self, langcode):
+        try:
+            from sacremoses import MosesTokenizer
+        except ImportError:
+            print("The Python tokenizer requires sacremoses, which is not installed: pip install sacremoses",
+                  file=sys.stderr)
+            sys.exit(1)
+        self.tokenizer = MosesTokenizer(langcode)
 
-    return tokenized_text
+    def tokenize(self, text):
+        return "\n".join(self.tokenizer.tokenize(line, aggressive_dash_splits=True, return_str=True, escape=True)
+                         if line.strip() else "" for line in text.split("\n"))
 
+    def process_batch(self, input_texts):
+        return [self.tokenize(text) for text in input_texts], "", 0
 
-def tokenize_external(text, word_tokeniser, morph_analyser):
-    tokenized_text = word_tokeniser.process(text)
 
-    if morph_analyser:
-        tokenized_text = morph_analyser.process(tokenized_text)
+def check(outputs, error_output, returncode, command):
+    if returncode != 0:
+        print(f"{command} exited with non-zero code: {returncode}", file=sys.stderr)
+        print(error_output.strip(), file=sys.stderr)
+        sys.exit(1)
+    return outputs
 
-    if tokenized_text == "":
-        tokenized_text = "\n"
 
-    return tokenized_text
+def tokenize_moses(texts, word_tokeniser, morph_analyser):
+    tokenized_texts = check(*word_tokeniser.process_batch(texts), "Word tokenizer")
 
+    # tokenizer.perl writes a line per input line: tokens are separated by a single space, and the lines removed
+    # from the end of every document (see PersistentTextProcessor) are added back
+    for i, (text, tokenized_text) in enumerate(zip(texts, tokenized_texts)):
+        lines = tokenized_text.split("\n")
+        n = text.count("\n") + 1
+        lines = [" ".join(line.split()) for line in lines[:n]] + [""] * (n - len(lines))
+        tokenized_texts[i] = "\n".join(lines)
 
-oparser = argparse.ArgumentParser(description="Tool that tokenizes plain text")
-oparser.add_argument('--text', dest='text', help='Plain text file', default="-")
-oparser.add_argument('--word-tokenizer', dest='tokenizer', default=None,
-                     help="Word tokenisation command line. If not provided, Moses tokenizer.perl will be used")
-oparser.add_argument('--morph-analyser', dest='lemmatizer', default="", help="Morphological analyser command line")
-oparser.add_argument('--langcode', dest='langcode', default="en",
-                     help="Language code for default sentence splitter and tokenizer")
+    return analyse(tokenized_texts, morph_analyser)
 
-options = oparser.parse_args()
 
-tokenizer = options.tokenizer
-tokenizer_func = None
+def tokenize_external(texts, word_tokeniser, morph_analyser):
+    tokenized_texts = check(*word_tokeniser.process_batch(texts), "Word tokenizer")
 
-# no custom tokenizer is provided, use moses (internally uses tool wrapper)
-if not tokenizer:
-    tokenizer = MosesTokenizer(options.langcode)
-    tokenizer_func = tokenize_moses
-# use custom tokenizer via ExternalTextProcessor (inefficient)
-else:
-    tokenizer = ExternalTextProcessor(os.path.expanduser(tokenizer).split())
-    tokenizer_func = tokenize_external
+    return analyse(tokenized_texts, morph_analyser)
 
-lemmatizer = options.lemmatizer
-if lemmatizer:
-    lemmatizer = ExternalTextProcessor(os.path.expanduser(lemmatizer).split())
 
-with open_xz_or_gzip_or_plain(options.text) if options.text != "-" else sys.stdin as reader:
-    for doc in reader:
-        content = base64.b64decode(doc.strip()).decode("utf-8").replace("\t", " ")
-        tokenized = tokenizer_func(content, tokenizer, lemmatizer).lower()
-        print(base64.b64encode(tokenized.encode("utf-8")).decode("utf-8"))
+def analyse(tokenized_texts, morph_analyser):
+    if morph_analyser:
+        tokenized_texts = check(*morph_analyser.process_batch(tokenized_texts), "Morphological analyser")
+
+    return [tokenized_text if tokenized_text != "" else "\n" for tokenized_text in tokenized_texts]
+
+
+def main():
+    oparser = argparse.ArgumentParser(description="Tool that tokenizes plain text")
+    oparser.add_argument('--text', dest='text', help='Plain text file', default="-")
+    oparser.add_argument('--word-tokenizer', dest='tokenizer', default=None,
+                         help="Word tokenisation command line. If not provided, Moses tokenizer.perl will be used")
+    oparser.add_argument('--morph-analyser', dest='lemmatizer', default="", help="Morphological analyser command line")
+    oparser.add_argument('--langcode', dest='langcode', default="en",
+                         help="Language code for default sentence splitter and tokenizer")
+    oparser.add_argument('--python-tokenizer', dest='python_tokenizer', action='store_true', default=False,
+                         help="If no word tokenisation command is provided, use the Python port of Moses tokenizer.perl "
+                              "(sacremoses) inside this process instead of tokenizer.perl")
+    oparser.add_argument('--persistent', dest='persistent', action='store_true', default=False,
+                         help="Run the word tokenisation and morphological analyser commands once, and send all the "
+                              "documents to them, instead of running them for every document. The commands must "
+                              "process their input line by line, flushing their output, and copy the lines with "
+                              "just the delimiter to their output")
+    oparser.add_argument('--delimiter', dest='delimiter', default=WORD_DOCUMENT_DELIMITER,
+                         help="Line written after every document sent to the persistent commands")
+    oparser.add_argument('--timeout', dest='timeout', type=float, default=60,
+                         help="Restart persistent commands if they do not write anything in this number of seconds "
+                              "while processing a document")
+    oparser.add_argument('--batch-size', dest='batch_size', type=int, default=64,
+                         help="Number of documents sent at once to the persistent commands")
+
+    options = oparser.parse_args()
+
+    def external(command):
+        command = os.path.expanduser(command).split()
+        if options.persistent:
+            return PersistentTextProcessor(command, delimiter=options.delimiter, timeout=options.timeout)
+        # (inefficient)
+        return ExternalTextProcessor(command)
+
+    # no custom tokenizer is provided, use moses: tokenizer.perl, which is run once for all the documents, or its port
+    if not options.tokenizer:
+        if options.python_tokenizer:
+            tokenizer = PythonTokenizer(options.langcode)
+        else:
+            tokenizer = PersistentTextProcessor(moses_command(options.langcode), delimiter=WORD_DOCUMENT_DELIMITER,
+                                                timeout=options.timeout)
+        tokenizer_func = tokenize_moses
+    # use custom tokenizer
+    else:
+        tokenizer = external(options.tokenizer)
+        tokenizer_func = tokenize_external
+
+    lemmatizer = None
+    if options.lemmatizer:
+        lemmatizer = external(options.lemmatizer)
+
+    with open_xz_or_gzip_or_plain(options.text) if options.text != "-" else sys.stdin as reader:
+        for docs in batched(reader, options.batch_size):
+            contents = [base64.b64decode(doc.strip()).decode("utf-8").replace("\t", " ") for doc in docs]
+            for tokenized in tokenizer_func(contents, tokenizer, lemmatizer):
+                print(base64.b64encode(tokenized.lower().encode("utf-8")).decode("utf-8"))
+
+
+if __name__ == "__main__":
+    main()
@@ -19,14 +19,17 @@ import sys
 import os
 import argparse
 import base64
-import string
 import ast
 import lzma
-from toolwrapper import ToolWrapper
-
-from bitextor.utils.common import open_xz_or_gzip_or_plain
-from bitextor.utils.common import ExternalTextProcessor
 import html
+from concurrent.futures import ProcessPoolExecutor
+
+from bitextor.utils.common import open_xz_or_gzip_or_plain, batched
+from bitextor.utils.common import PersistentTextProcessor
+from bitextor.utils.sentence_filter import count_punctuation_and_digits
+
+# Paragraph mark written by split-sentences.perl for empty lines
+PARAGRAPH_MARK = "<P>"
 
 
 def get_lang_or_default(dictionary, language):
@@ -40,114 +43,153 @@ def get_lang_or_default(dictionary, language):
         return None
 
 
-def extract_encoded_text(encoded, sent_tokeniser, word_tokeniser, morph_analyser):
+def is_trash(sentence):
+    """
+    Whether at least half of the characters of a sentence are punctuation or digits
+    """
+    return count_punctuation_and_digits(sentence) >= len(sentence) // 2
+
+
+def check(outputs, error_output, returncode):
+    if returncode != 0:
+        print(error_output.strip(), file=sys.stderr)
+        sys.exit(1)
+    return outputs
+
+
+def extract_encoded_texts(encoded_texts, sent_tokeniser, word_tokeniser, morph_analyser):
+    """
+    Sentence split, filter, tokenise and analyse a batch of base64-encoded documents: every tool processes the whole
+    batch in a single round trip. Returns the list of the base64-encoded processed documents
+    """
     if not sent_tokeniser:
-        return encoded
-
-    content = base64.b64decode(encoded).decode("utf-8").replace("\t", " ")
-    tokenized_segs = []
-    seg = ""
-    sent_tokeniser.writeline(html.escape(content.strip()) + "\n")
-    while seg != "<P>":
-        seg = sent_tokeniser.readline().strip()
-        if seg != "" and seg != "<P>":
-            tokenized_segs.append(html.unescape(seg))
-
-    tokenized_filtered = []
-    for sent in tokenized_segs:
-        if sum([1 for m in sent if m in string.punctuation + string.digits]) < len(sent) // 2:
-            tokenized_filtered.append(sent)
+        return encoded_texts
+
+    # the text is escaped so that it cannot contain lines that look like tags (paragraph marks and the delimiter)
+    contents = [html.escape(base64.b64decode(encoded).decode("utf-8").replace("\t", " ").strip())
+                for encoded in encoded_texts]
+    segmented = check(*sent_tokeniser.process_batch(contents))
+
+    documents = []
+    for output in segmented:
+        segs = (seg.strip() for seg in output.split("\n"))
+        segs = (html.unescape(seg) for seg in segs if seg != "" and seg != PARAGRAPH_MARK)
+        documents.append([seg for seg in segs if not is_trash(seg)])
+
     if not word_tokeniser:
-        b64text = base64.b64encode("\n".join(tokenized_filtered).lower().encode("utf-8"))
-        return b64text.decode()
+        return [base64.b64encode("\n".join(sents).lower().encode("utf-8")).decode() for sents in documents]
 
-    tokenized_text = ""
-    for sent in tokenized_filtered:
-        word_tokeniser.writeline(sent)
-        tokenized_text = tokenized_text + word_tokeniser.readline().strip() + "\n"
+    # tokenisers and morphological analysers write a line per input line, so the sentences of all the documents are
+    # processed at once and then split by document
+    sentences = [sent for sents in documents for sent in sents]
+    tokenized = [sent.strip() for sent in check(*word_tokeniser.process_lines(sentences))]
     if morph_analyser:
-        proc_morph = ExternalTextProcessor(morph_analyser.split())  # Apertium does line buffering
-        tokenized_text = proc_morph.process(tokenized_text)
-
-    b64text = base64.b64encode(tokenized_text.lower().encode("utf-8"))
-    return b64text.decode()
-
-
-oparser = argparse.ArgumentParser(
-    description="Tool that tokenizes (sentences, tokens and morphemes) plain text")
-oparser.add_argument('--folder', dest='folder', help='Bitextorlang folder', required=True)
-oparser.add_argument('--langs', dest='langs', default=None,
-                     help="List of  two-character language codes (comma-separated) to tokenize. "
-                          "If not specified, every language will be processed")
-oparser.add_argument('--sentence-splitters', dest='splitters', required=True,
-                     help="A map of sentence splitter commands. "
-                          "Format: {\"lang1\": \"script1\", ... , \"langN\": \"scriptN\", \"default\": \"defaultScript\"}. "
-                          "For languages that are not in this map but are in 'langs', the defaultScript will be used. "
-                          "If defaultScript is not specified, language will be outputted in plain text.")
-oparser.add_argument('--word-tokenizers', dest='tokenizers', required=True,
-                     help="A map of word tokenisation commands. "
-                          "Format: {\"lang1\": \"script1\", ... , \"langN\": \"scriptN\", \"default\": \"defaultScript\"}. "
-                          "For languages that are not in this map but are in 'langs', the defaultScript will be used. "
-                          "If defaultScript is not specified, word tokenization for that language will be omitted.")
-oparser.add_argument('--morph-analysers', dest='lemmatizers',
-                     help="A map of morphological analysers. "
-                          "Format: {\"lang1\": \"script1\", ... , \"langN\": \"scriptN\", \"default\": \"defaultScript\"}. "
-                          "For languages that are not in this map but a re in 'langs', the defaultScript will be used. "
-                          "If defaultScript is not specified, morphological analysis for that language will be omitted.")
-
-options = oparser.parse_args()
-
-if options.langs:
-    langs = options.langs.split(',')
-else:
-    langs = []
-
-try:
-    options.splitters = ast.literal_eval(options.splitters)
-except BaseException:
-    print("Sentence splitters incorrect format", file=sys.stderr)
-    sys.exit(1)
-
-try:
-    options.tokenizers = ast.literal_eval(options.tokenizers)
-except BaseException:
-    print("Word tokenizers incorrect format", file=sys.stderr)
-    sys.exit(1)
-
-try:
-    if options.lemmatizers:
-        options.lemmatizers = ast.literal_eval(options.lemmatizers)
-except BaseException:
-    print("Morphological analysers incorrect format")
-    sys.exit(1)
-
-lang_files = {}
-
-folder = os.fsencode(options.folder)
-for langfolder in os.listdir(folder):
-    lang = os.fsdecode(langfolder)
-    if not os.path.isdir(options.folder + "/" + lang) or len(lang) > 2:
-        continue
-    fullname = os.path.join(options.folder, lang + "/plain_text.xz")
-    if os.path.isfile(fullname) and (not langs or lang in langs):
-        if lang not in lang_files:
-            lang_files[lang] = lzma.open(os.path.join(options.folder, lang + "/plain_tokenized.xz"), "wb")
-        senttok_command = get_lang_or_default(options.splitters, lang)
-        senttok = None
-        if senttok_command:
-            senttok = ToolWrapper(senttok_command.split())
-        wordtok_command = get_lang_or_default(options.tokenizers, lang)
-        wordtok = None
-        if wordtok_command:
-            wordtok = ToolWrapper(wordtok_command.split())
-        morphtok_command = get_lang_or_default(options.lemmatizers, lang)
-        morphtok = None
-        if morphtok_command:
-            morphtok = ToolWrapper(morphtok_command.split())
-        with open_xz_or_gzip_or_plain(fullname) as text_reader:
-            for line in text_reader:
-                encodedtext = line.strip()
-                tokenized = extract_encoded_text(encodedtext, senttok, wordtok, morphtok)
-                lang_files[lang].write("{}\n".format(tokenized).encode("utf-8"))
-for lang in lang_files:
-    lang_files[lang].close()
+        tokenized = check(*morph_analyser.process_lines(tokenized))
+
+    encoded = []
+    start = 0
+    for sents in documents:
+        end = start + len(sents)
+        tokenized_text = "".join(sent + "\n" for sent in tokenized[start:end])
+        encoded.append(base64.b64encode(tokenized_text.lower().encode("utf-8")).decode())
+        start = end
+    return encoded
+
+
+def tokenize_folder(lang, input_path, output_path, senttok_command, wordtok_command, morphtok_command, batch_size):
+    """
+    Tokenise the plain text of a language with a single process of each tool
+    """
+    senttok = PersistentTextProcessor(senttok_command.split()) if senttok_command else None
+    wordtok = PersistentTextProcessor(wordtok_command.split()) if wordtok_command else None
+    # Apertium does line buffering
+    morphtok = PersistentTextProcessor(morphtok_command.split()) if morphtok_command else None
+
+    with open_xz_or_gzip_or_plain(input_path) as text_reader, lzma.open(output_path, "wb") as writer:
+        for lines in batched(text_reader, batch_size):
+            tokenized = extract_encoded_texts([line.strip() for line in lines], senttok, wordtok, morphtok)
+            writer.write("".join(f"{text}\n" for text in tokenized).encode("utf-8"))
+
+    for tool in (senttok, wordtok, morphtok):
+        if tool:
+            tool.stop()
+    return lang
+
+
+def main():
+    oparser = argparse.ArgumentParser(
+        description="Tool that tokenizes (sentences, tokens and morphemes) plain text")
+    oparser.add_argument('--folder', dest='folder', help='Bitextorlang folder', required=True)
+    oparser.add_argument('--langs', dest='langs', default=None,
+                         help="List of  two-character language codes (comma-separated) to tokenize. "
+                              "If not specified, every language will be processed")
+    oparser.add_argument('--sentence-splitters', dest='splitters', required=True,
+                         help="A map of sentence splitter commands. "
+                              "Format: {\"lang1\": \"script1\", ... , \"langN\": \"scriptN\", \"default\": \"defaultScript\"}. "
+                              "For languages that are not in this map but are in 'langs', the defaultScript will be used. "
+                              "If defaultScript is not specified, language will be outputted in plain text. "
+                              "Splitters must copy the lines with just '<BITEXTOR-DOCUMENT-END>' to their output, like "
+                              "split-sentences.perl does.")
+    oparser.add_argument('--word-tokenizers', dest='tokenizers', required=True,
+                         help="A map of word tokenisation commands. "
+                              "Format: {\"lang1\": \"script1\", ... , \"langN\": \"scriptN\", \"default\": \"defaultScript\"}. "
+                              "For languages that are not in this map but are in 'langs', the defaultScript will be used. "
+                              "If defaultScript is not specified, word tokenization for that language will be omitted.")
+    oparser.add_argument('--morph-analysers', dest='lemmatizers',
+                         help="A map of morphological analysers. "
+                              "Format: {\"lang1\": \"script1\", ... , \"langN\": \"scriptN\", \"default\": \"defaultScript\"}. "
+                              "For languages that are not in this map but a re in 'langs', the defaultScript will be used. "
+                              "If defaultScript is not specified, morphological analysis for that language will be omitted.")
+    oparser.add_argument('--batch-size', dest='batch_size', type=int, default=64,
+                         help="Number of documents sent at once to the tools")
+    oparser.add_argument('--workers', dest='workers', type=int, default=1,
+                         help="Number of languages processed at the same time")
+
+    options = oparser.parse_args()
+
+    if options.langs:
+        langs = options.langs.split(',')
+    else:
+        langs = []
+
+    try:
+        options.splitters = ast.literal_eval(options.splitters)
+    except BaseException:
+        print("Sentence splitters incorrect format", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        options.tokenizers = ast.literal_eval(options.tokenizers)
+    except BaseException:
+        print("Word tokenizers incorrect format", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if options.lemmatizers:
+            options.lemmatizers = ast.literal_eval(options.lemmatizers)
+    except BaseException:
+        print("Morphological analysers incorrect format")
+        sys.exit(1)
+
+    jobs = []
+    for langfolder in sorted(os.listdir(os.fsencode(options.folder))):
+        lang = os.fsdecode(langfolder)
+        if not os.path.isdir(options.folder + "/" + lang) or len(lang) > 2:
+            continue
+        fullname = os.path.join(options.folder, lang + "/plain_text.xz")
+        if os.path.isfile(fullname) and (not langs or lang in langs):
+            jobs.append((lang, fullname, os.path.join(options.folder, lang + "/plain_tokenized.xz"),
+                         get_lang_or_default(options.splitters, lang), get_lang_or_default(options.tokenizers, lang),
+                         get_lang_or_default(options.lemmatizers, lang), options.batch_size))
+
+    if options.workers > 1 and jobs:
+        with ProcessPoolExecutor(max_workers=options.workers) as executor:
+            for _ in executor.map(tokenize_folder, *zip(*jobs)):
+                pass
+    else:
+        for job in jobs:
+            tokenize_folder(*job)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,34 +20,19 @@ from warcio.warcwriter import WARCWriter
 from warcio.statusandheaders import StatusAndHeaders
 import sys
 import argparse
-import cchardet
 import re
 import logging
 import lzma
-import subprocess
-import zipfile
-import io
 from io import BytesIO
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-
-def convert_encoding(data):
-    encoding = cchardet.detect(data)['encoding']
-    decoded = ''
-    # if detected encoding fails (or is None), try some common encodings
-    for enc in [encoding, 'utf-8', 'iso-8859-1', 'windows‑1252']:
-        try:
-            decoded = data.decode(encoding)
-            return enc, decoded
-        except BaseException:
-            pass
-    return None, ''
-
-
-def pdf2html(data):
-    pconverter = subprocess.Popen(["pdftohtml", "-i", "-stdout", "-", "-"],
-                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.PIPE)
-    converter_stdout, error = pconverter.communicate(input=data)
-    return [converter_stdout.replace(b"&#160;", b" ")]
+from bitextor.utils.common import bounded_imap
+from bitextor.utils.encoding import convert_encoding
+from bitextor.utils.pdftohtml import PdfToHtmlPool
+from bitextor.utils.record_filter import FilterChain, record_filters, DEFAULT_MAX_SIZE
+from bitextor.utils.warcindex import iter_range, parse_byte_range
+from bitextor.utils.zipdocs import extract_members, MAX_MEMBER_SIZE, MAX_DOCUMENT_SIZE
 
 
 def pdfextract(data, pdfextractor):
@@ -58,177 +43,96 @@ def pdfextract(data, pdfextractor):
         return [b""]
 
 
-def openoffice2html(data):
-    datastream = io.BytesIO(data)
-    try:
-        openoffice_file = zipfile.ZipFile(datastream)
-        return [openoffice_file.read('content.xml')]
-    except zipfile.BadZipFile:
-        return []
-
-
-def office2html(data):
-    datastream = io.BytesIO(data)
-    try:
-        office_file = zipfile.ZipFile(datastream)
-        # word/document.xml, ppt/slides/slide*.xml, xl/sharedStrings.xml
-        xmls = []
-        for xml in office_file.namelist():
-            if "word/document.xml" == xml or "ppt/slides/slide" == xml[0:16] or "xl/sharedStrings.xml" == xml:
-                try:
-                    xmls.append(office_file.read(xml))
-                except Exception as ex:
-                    continue
-        return xmls
-    except zipfile.BadZipFile:
-        return []
-
-
-def epub2html(data):
-    datastream = io.BytesIO(data)
-    try:
-        epub_file = zipfile.ZipFile(datastream)
-        # EPUB/*html
-        xmls = []
-        for xml in epub_file.namelist():
-            if "ml" == xml[-2:]:
-                try:
-                    xmls.append(epub_file.read(xml))
-                except Exception as ex:
-                    continue
-        return xmls
-    except zipfile.BadZipFile:
-        return []
-
-
-oparser = argparse.ArgumentParser(
-    description="Script that takes every record in a WARC file and runs basic preprocessing, which includes: HTML"
-                "normalization, deduplication. The result is a WARC file.")
-oparser.add_argument('-v', "--verbose", action="store_true", default=False,
-                     help="Produce additional information about preprocessing through stderr.")
-oparser.add_argument('-o', '--output', dest='output', help='Output WARC file', default=sys.stdout)
-oparser.add_argument('-i', '--input', dest='input', help='Input WARC file', default=sys.stdin)
-oparser.add_argument('--only-broader', dest='onlybroader', action="store_true",
-                     help="Only outputs broader document format records", default=False)
-oparser.add_argument('--pdfextract', action="store_true", help='Use pdf-extract engine or pdftohtml for PDFs',
-                     default=False)
-oparser.add_argument('--pe_configfile', dest='configFile', default="",
-                     help='PDFExtract configuration file for language model paths')
-
-oparser.add_argument('--sentence_join_path', dest='sentenceJoinPath', help='sentence-join.py path', default="")
-oparser.add_argument('--kenlm_path', dest='kenlmPath', help='kenlm binary folder path', default="")
-oparser.add_argument('--pdfpass', dest='pdfpass', help='Pass PDFs verbatim to file', default=None)
-oparser.add_argument('--ftfy', action='store_true', help='User fix-text-for-you to fix possible encoding problems',
-                     default=False)
-oparser.add_argument('--cleanhtml', action='store_true', help='Clean HTML to remove javascript, css and head tags',
-                     default=False)
-oparser.add_argument('--disable-output-gzip', dest='disable_output_gzip', action='store_true',
-                     help='Disable compression of output WARC')
-oparser.add_argument('--disable-pdfs-gzip', dest='disable_pdfs_gzip', action='store_true',
-                     help='Disable compression of PDFs WARC (if --pdfpass is enabled)')
-options = oparser.parse_args()
-
-logging.basicConfig(
-    format='%(asctime)s %(levelname)-8s %(message)s',
-    level=logging.INFO if options.verbose else logging.ERROR,
-    datefmt='%Y-%m-%d %H:%M:%S')
-
-f = None
-fo = None
-po = None
-extractor = None
-
-if options.input == sys.stdin or options.input == '-':
-    f = ArchiveIterator(sys.stdin.buffer)
-elif options.input[-3:] == ".xz":
-    f = ArchiveIterator(lzma.open(options.input, 'r'))
-elif options.input[-3:] == ".gz":
-    f = ArchiveIterator(open(options.input, 'rb'))
-else:
-    f = ArchiveIterator(open(options.input, 'rb'))
-
-if options.output == sys.stdout or options.output == '-':
-    fo = WARCWriter(sys.stdout.buffer, gzip=True)
-else:
-    fo = WARCWriter(open(options.output, 'wb'), gzip=not options.disable_output_gzip)
-
-if options.pdfpass is not None:
-    po = WARCWriter(open(options.pdfpass, 'wb'), gzip=not options.disable_pdfs_gzip)
-
-if not options.pdfpass and options.pdfextract:
-    import jpype
-    from pdfextract.extract import Extractor as ExtrP
-    extractor = ExtrP(
-        configFile=options.configFile,
-        sentenceJoinPath=options.sentenceJoinPath,
-        kenlmPath=options.kenlmPath)
-
-cleaner = None
-if options.cleanhtml:
-    from lxml.html.clean import Cleaner
-    cleaner = Cleaner(style=True, links=True, add_nofollow=True, page_structure=False, safe_attrs_only=False)
-
-if options.output == sys.stdout or options.output == '-':
-    filename = ""
-else:
-    filename = options.output
-
-fo.write_record(
-    fo.create_warcinfo_record(
-        filename=filename,
-        info={
-            'software': 'bitextor/bitextor-warc2htmlwarc.py',
-            'format': 'WARC File Format 1.0'}))
-
-for record in f:
-    # Initial checks
-    if record.rec_type != 'response' and record.rec_type != 'resource':
-        continue
-    if not record.rec_headers.get_header('WARC-Target-URI'):
-        url = None
-    elif record.rec_headers.get_header('WARC-Target-URI')[0] == '<' and record.rec_headers.get_header('WARC-Target-URI')[-1] == '>':
-        url = record.rec_headers.get_header('WARC-Target-URI')[1:-1]
-    else:
-        url = record.rec_headers.get_header('WARC-Target-URI')
-    if url == "unknown" or not url:
-        logging.info("Skipping page with unknown URL")
-        continue
-    if record.rec_headers.get_header('Content-Type') is None:
-        continue
-    if "text/dns" in record.rec_headers.get_header('Content-Type'):
-        continue
-    pageSize = int(record.rec_headers.get_header('Content-Length'))
-    if pageSize > 5242880:
-        logging.info("Skipping page, over limit. " + str(pageSize) + " " + url)
-        continue
-    if record.http_headers is not None and record.http_headers.get_header('Content-Type') is not None:
-        if "image/" in record.http_headers.get_header('Content-Type') \
-                or "audio/" in record.http_headers.get_header('Content-Type') \
-                or "video/" in record.http_headers.get_header('Content-Type') \
-                or "text/x-component" in record.http_headers.get_header('Content-Type') \
-                or "text/x-js" in record.http_headers.get_header('Content-Type') \
-                or "text/javascript" in record.http_headers.get_header('Content-Type') \
-                or "application/x-javascript" in record.http_headers.get_header('Content-Type') \
-                or "text/css" in record.http_headers.get_header('Content-Type') \
-                or "application/javascript" in record.http_headers.get_header('Content-Type') \
-                or "application/x-shockwave-flash" in record.http_headers.get_header('Content-Type') \
-                or "application/octet-stream" in record.http_headers.get_header('Content-Type') \
-                or "application/x-font-ttf" in record.http_headers.get_header('Content-Type'):
-            continue
-
-    url = url.lower()
-    url = url.replace('\t', ' ')
-    if url[-4:] == ".gif" or url[-4:] == ".jpg" or url[-5:] == ".jpeg" or url[-4:] == ".png" \
-            or url[-4:] == ".css" or url[-3:] == ".js" or url[-4:] == ".mp3" or url[-4:] == ".mp4" \
-            or url[-4:] == ".ogg" or url[-5:] == ".midi" or url[-4:] == ".swf":
-        continue
-
-    # Ignore robots.txt when processing records
-    if url[-11:] == "/robots.txt":
-        continue
-
-    payload = record.content_stream().read()
-    payloads = []
+# Formats of the documents that are converted to HTML, by URL suffix
+DOCUMENT_FORMATS = {"pdf": "pdf", "odt": "odf", "ods": "odf", "odp": "odf", "docx": "office", "pptx": "office",
+                    "xlsx": "office", "epub": "epub"}
+DOCUMENT_FORMAT_RE = re.compile(r"\.(pdf|odt|ods|odp|docx|pptx|xlsx|epub)$")
+
+
+# Number of bytes at the beginning of a payload used to detect its type
+SNIFF_SIZE = 1024
+
+# Signatures of binary formats that are never converted, even if they are served as HTML
+BINARY_SIGNATURES = (b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a", b"\xff\xd8\xff", b"OggS\x00", b"\x1f\x8b\x08",
+                     b"7z\xbc\xaf\x27\x1c", b"Rar!\x1a\x07", b"\x7fELF", b"wOFF", b"wOF2", b"PK\x03\x04")
+
+
+def sniff_payload(state):
+    """
+    Read the first bytes of the payload of a record and find out its document format: PDFs are detected by their
+    signature too, and HTML records whose payload is actually binary are rejected without reading the rest of it
+    """
+    url = state["url"]
+    content_type = state["content_type"]
+    state["stream"] = state["record"].content_stream()
+    state["head"] = state["stream"].read(SNIFF_SIZE)
+
+    match = DOCUMENT_FORMAT_RE.search(url)
+    doc_format = DOCUMENT_FORMATS[match.group(1)] if match else None
+    if (content_type is not None and "application/pdf" in content_type) or state["head"].startswith(b"%PDF-"):
+        doc_format = "pdf"
+    elif doc_format is None and state["head"].startswith(BINARY_SIGNATURES):
+        logging.info("Skipping binary payload of " + url)
+        return False
+    state["doc_format"] = doc_format
+    return True
+
+
+def payload_reader(max_size):
+    """
+    Filter that reads the rest of the payload of a record after sniff_payload, and rejects the record without reading
+    more than max_size bytes (0 for no limit) if it is larger, in case its Content-Length was wrong or missing
+    """
+    def read_payload(state):
+        head = state.pop("head")
+        stream = state.pop("stream")
+        rest = stream.read(max_size - len(head) + 1) if max_size else stream.read()
+        if max_size and len(head) + len(rest) > max_size:
+            logging.info("Skipping page, payload over limit. " + state["url"])
+            return False
+        state["payload"] = head + rest if rest else head
+        return True
+
+    return read_payload
+
+
+# Per-process state of the conversion: the PDFExtract extractor and the HTML cleaner are created once in every
+# process that converts documents (the main one or each worker)
+converter = None
+
+
+def init_converter(config):
+    global converter
+    converter = dict(config)
+    converter["extractor"] = None
+    converter["cleaner"] = None
+
+    if config["pdfextract"]:
+        from pdfextract.extract import Extractor as ExtrP
+        converter["extractor"] = ExtrP(
+            configFile=config["configFile"],
+            sentenceJoinPath=config["sentenceJoinPath"],
+            kenlmPath=config["kenlmPath"])
+
+    if config["cleanhtml"]:
+        from lxml.html.clean import Cleaner
+        converter["cleaner"] = Cleaner(style=True, links=True, add_nofollow=True, page_structure=False,
+                                       safe_attrs_only=False)
+
+
+def read_record(record, record_filter, po=None):
+    """
+    Check whether a record has to be converted and return its (url, payload, record type, HTTP headers, WARC
+    Content-Type, HTTP Content-Type, document format), or None otherwise. The document format is 'pdf', 'odf',
+    'office', 'epub' or None for HTML ('pdfhtml' after convert_pdfs). PDFs are written verbatim to po, if given, instead
+    of being returned
+    """
+    state = {"record": record}
+    if not record_filter(state):
+        return None
+    url = state["url"]
+    payload = state["payload"]
+    doc_format = state["doc_format"]
 
     if not record.http_headers or record.http_headers.to_str()[:7] != "HTTP/1.":
         if record.http_headers:
@@ -247,13 +151,8 @@ for record in f:
             # content length and content type will be filled before writing
             http_headers = StatusAndHeaders(record.http_headers.get_statuscode(), [])
 
-    bdf = True
-    # Extract payloads (XML) from non-HTML document formats
-    if url[-4:] == ".pdf" \
-            or ((record.http_headers is not None and record.http_headers.get_header('Content-Type') is not None)
-                and "application/pdf" in record.http_headers.get_header('Content-Type')
-                ):
-        if options.pdfpass:
+    if doc_format == "pdf":
+        if po:
             new_record = po.create_warc_record(
                 uri=url,
                 record_type=record_type,
@@ -261,33 +160,66 @@ for record in f:
                 payload=BytesIO(payload),
                 http_headers=http_headers)
             po.write_record(new_record)
-            continue  # do not process further!
-        if options.pdfextract:
-            payloads = pdfextract(payload, extractor)
-        else:
-            payloads = pdf2html(payload)
-    elif url[-4:] == ".odt" or url[-4:] == ".ods" or url[-4:] == ".odp":
-        payloads = openoffice2html(payload)
-    elif url[-5:] == ".docx" or url[-5:] == ".pptx" or url[-5:] == ".xlsx":
-        payloads = office2html(payload)
-    elif url[-5:] == ".epub":
-        payloads = epub2html(payload)
+            return None  # do not process further!
+
+    return url, payload, record_type, http_headers, record.content_type, state["content_type"], doc_format
+
+
+def convert_pdfs(documents, pdf_pool):
+    """
+    Convert the PDFs of a stream of documents with pdftohtml in the background while the next documents are read. The
+    payload of PDF documents is replaced by the list of their converted payloads, and the order of the documents is
+    kept
+    """
+    pending = deque()
+    window = pdf_pool.processes * 2
+
+    for document in documents:
+        future = None
+        if document[6] == "pdf":
+            future = pdf_pool.submit(document[1], document[0])
+        pending.append((document, future))
+
+        # yield the documents that are ready, and wait for the oldest one if there are too many
+        while pending and (pending[0][1] is None or pending[0][1].done() or len(pending) > window):
+            document, future = pending.popleft()
+            yield document if future is None else document[:1] + (future.result(),) + document[2:6] + ("pdfhtml",)
+
+    while pending:
+        document, future = pending.popleft()
+        yield document if future is None else document[:1] + (future.result(),) + document[2:6] + ("pdfhtml",)
+
+
+def convert_document(document):
+    """
+    Convert a document, as returned by read_record, to normalized HTML. Returns its URL, its WARC Content-Type and a
+    list with the (record type, HTTP headers, HTML) of every record that has to be written for it
+    """
+    url, payload, record_type, http_headers, warc_content_type, content_type, doc_format = document
+
+    bdf = doc_format is not None
+    # Extract payloads (XML) from non-HTML document formats
+    if doc_format == "pdf":
+        payloads = pdfextract(payload, converter["extractor"])
+    elif doc_format == "pdfhtml":
+        payloads = payload
+    elif doc_format in ("odf", "office", "epub"):
+        # the members are extracted one at a time as they are converted
+        payloads = extract_members(payload, doc_format, max_member_size=converter["zipMaxMemberSize"],
+                                   max_document_size=converter["zipMaxSize"], url=url)
+    elif converter["onlybroader"]:
+        payloads = []
     else:
-        bdf = False
-        if options.onlybroader:
-            payloads = []
-        else:
-            payloads = [payload]
-
-    date = record.rec_headers.get_header('WARC-Date')
-    recordId = record.rec_headers.get_header('WARC-Record-ID')
+        payloads = [payload]
+
+    converted = []
     for payload in payloads:
         if not payload:
             continue
 
         logging.info("Processing document: " + url)
         # We convert into UTF8 first of all
-        orig_encoding, text = convert_encoding(payload)
+        orig_encoding, text = convert_encoding(payload, content_type if not bdf else None)
 
         if orig_encoding is None:
             logging.info("Encoding of document " + url + " could not be identified")
@@ -300,14 +232,14 @@ for record in f:
         clean_html = ""
         tree = ""
         try:
-            if options.cleanhtml:
+            if converter["cleanhtml"]:
                 # HTML is then normalized
                 logging.info(url + ": cleaning HTML")
-                clean_html = cleaner.clean_html(text)
+                clean_html = converter["cleaner"].clean_html(text)
             else:
                 clean_html = text
 
-            if options.ftfy:
+            if converter["ftfy"]:
                 import ftfy
                 tree = ftfy.fix_text(clean_html, unescape_html=False, fix_character_width=False)
             else:
@@ -332,10 +264,150 @@ for record in f:
                 headers=[('Content-Type', 'text/html'), ('Content-Length', str(len(clean_tree)))]
             )
 
-        new_record = fo.create_warc_record(
-            uri=url,
-            record_type=record_type,
-            warc_content_type=record.content_type,
-            payload=BytesIO(clean_tree),
-            http_headers=http_headers)
-        fo.write_record(new_record)
+        # the headers are shared by all the payloads of the document, so every record gets a copy of them
+        headers = StatusAndHeaders(http_headers.statusline, list(http_headers.headers),
+                                   http_headers.protocol) if http_headers else None
+        converted.append((record_type, headers, clean_tree))
+
+    return url, warc_content_type, converted
+
+
+def main():
+    oparser = argparse.ArgumentParser(
+        description="Script that takes every record in a WARC file and runs basic preprocessing, which includes: HTML"
+                    "normalization, deduplication. The result is a WARC file.")
+    oparser.add_argument('-v', "--verbose", action="store_true", default=False,
+                         help="Produce additional information about preprocessing through stderr.")
+    oparser.add_argument('-o', '--output', dest='output', help='Output WARC file', default=sys.stdout)
+    oparser.add_argument('-i', '--input', dest='input', help='Input WARC file', default=sys.stdin)
+    oparser.add_argument('--byte-range', dest='byte_range', default=None,
+                         help='Only convert the records of the input WARC file that start in the byte range START-END '
+                              '(END can be empty), where START is the offset of a record in its index '
+                              '(see bitextor_warcindex.py)')
+    oparser.add_argument('--only-broader', dest='onlybroader', action="store_true",
+                         help="Only outputs broader document format records", default=False)
+    oparser.add_argument('--pdfextract', action="store_true", help='Use pdf-extract engine or pdftohtml for PDFs',
+                         default=False)
+    oparser.add_argument('--pe_configfile', dest='configFile', default="",
+                         help='PDFExtract configuration file for language model paths')
+
+    oparser.add_argument('--sentence_join_path', dest='sentenceJoinPath', help='sentence-join.py path', default="")
+    oparser.add_argument('--kenlm_path', dest='kenlmPath', help='kenlm binary folder path', default="")
+    oparser.add_argument('--pdfpass', dest='pdfpass', help='Pass PDFs verbatim to file', default=None)
+    oparser.add_argument('--ftfy', action='store_true', help='User fix-text-for-you to fix possible encoding problems',
+                         default=False)
+    oparser.add_argument('--cleanhtml', action='store_true', help='Clean HTML to remove javascript, css and head tags',
+                         default=False)
+    oparser.add_argument('--disable-output-gzip', dest='disable_output_gzip', action='store_true',
+                         help='Disable compression of output WARC')
+    oparser.add_argument('--disable-pdfs-gzip', dest='disable_pdfs_gzip', action='store_true',
+                         help='Disable compression of PDFs WARC (if --pdfpass is enabled)')
+    oparser.add_argument('--max-size', dest='max_size', type=int, default=DEFAULT_MAX_SIZE,
+                         help='Records larger than this size in bytes are discarded; 0 for no limit')
+    oparser.add_argument('--workers', dest='workers', type=int, default=1,
+                         help='Number of processes used to convert the records (PDF conversion, HTML cleaning, '
+                              'ftfy...); records are read and written by the main process')
+    oparser.add_argument('--unordered', action='store_true', default=False,
+                         help='With --workers, write the records as soon as they are converted instead of in the '
+                              'same order they were read')
+    oparser.add_argument('--pdf-processes', dest='pdf_processes', type=int, default=2,
+                         help='Maximum number of concurrent pdftohtml processes (if --pdfextract is not enabled)')
+    oparser.add_argument('--pdf-timeout', dest='pdf_timeout', type=float, default=60,
+                         help='Maximum time in seconds for the conversion of a PDF with pdftohtml (0 for no limit)')
+    oparser.add_argument('--pdf-max-size', dest='pdf_max_size', type=int, default=0,
+                         help='PDFs larger than this number of bytes are not converted with pdftohtml (0 for no limit)')
+    oparser.add_argument('--zip-max-member-size', dest='zip_max_member_size', type=int, default=MAX_MEMBER_SIZE,
+                         help='Maximum decompressed size in bytes of the XML files extracted from office, '
+                              'OpenDocument and EPUB documents; larger ones are skipped')
+    oparser.add_argument('--zip-max-size', dest='zip_max_size', type=int, default=MAX_DOCUMENT_SIZE,
+                         help='Maximum decompressed size in bytes of all the XML files extracted from an office, '
+                              'OpenDocument or EPUB document')
+    options = oparser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s %(levelname)-8s %(message)s',
+        level=logging.INFO if options.verbose else logging.ERROR,
+        datefmt='%Y-%m-%d %H:%M:%S')
+
+    f = None
+    fo = None
+    po = None
+
+    if options.byte_range:
+        f = iter_range(options.input, *parse_byte_range(options.byte_range))
+    elif options.input == sys.stdin or options.input == '-':
+        f = ArchiveIterator(sys.stdin.buffer)
+    elif options.input[-3:] == ".xz":
+        f = ArchiveIterator(lzma.open(options.input, 'r'))
+    elif options.input[-3:] == ".gz":
+        f = ArchiveIterator(open(options.input, 'rb'))
+    else:
+        f = ArchiveIterator(open(options.input, 'rb'))
+
+    if options.output == sys.stdout or options.output == '-':
+        fo = WARCWriter(sys.stdout.buffer, gzip=True)
+    else:
+        fo = WARCWriter(open(options.output, 'wb'), gzip=not options.disable_output_gzip)
+
+    if options.pdfpass is not None:
+        po = WARCWriter(open(options.pdfpass, 'wb'), gzip=not options.disable_pdfs_gzip)
+
+    config = dict(pdfextract=not options.pdfpass and options.pdfextract, configFile=options.configFile,
+                  sentenceJoinPath=options.sentenceJoinPath, kenlmPath=options.kenlmPath,
+                  cleanhtml=options.cleanhtml, ftfy=options.ftfy, onlybroader=options.onlybroader,
+                  zipMaxMemberSize=options.zip_max_member_size, zipMaxSize=options.zip_max_size)
+
+    if options.output == sys.stdout or options.output == '-':
+        filename = ""
+    else:
+        filename = options.output
+
+    fo.write_record(
+        fo.create_warcinfo_record(
+            filename=filename,
+            info={
+                'software': 'bitextor/bitextor-warc2htmlwarc.py',
+                'format': 'WARC File Format 1.0'}))
+
+    record_filter = FilterChain(record_filters(options.max_size))
+    record_filter.add("binary payload", sniff_payload)
+    record_filter.add("payload size", payload_reader(options.max_size))
+    documents = (document for document in (read_record(record, record_filter, po) for record in f)
+                 if document is not None)
+
+    pdf_pool = None
+    if not options.pdfpass and not options.pdfextract:
+        pdf_pool = PdfToHtmlPool(processes=options.pdf_processes, timeout=options.pdf_timeout,
+                                 max_size=options.pdf_max_size)
+        documents = convert_pdfs(documents, pdf_pool)
+
+    executor = None
+    if options.workers > 1:
+        # the JVM of PDFExtract and the HTML cleaner are loaded by every worker
+        executor = ProcessPoolExecutor(max_workers=options.workers, initializer=init_converter, initargs=(config,))
+        results = bounded_imap(executor, convert_document, documents, window=options.workers * 2,
+                               ordered=not options.unordered)
+    else:
+        init_converter(config)
+        results = map(convert_document, documents)
+
+    for url, warc_content_type, converted in results:
+        for record_type, http_headers, clean_tree in converted:
+            new_record = fo.create_warc_record(
+                uri=url,
+                record_type=record_type,
+                warc_content_type=warc_content_type,
+                payload=BytesIO(clean_tree),
+                http_headers=http_headers)
+            fo.write_record(new_record)
+
+    if executor:
+        executor.shutdown()
+    if pdf_pool:
+        pdf_pool.shutdown()
+        pdf_pool.report()
+    record_filter.report()
+
+
+if __name__ == '__main__':
+    main()
@@ -19,68 +19,38 @@ import html
 from warcio.archiveiterator import ArchiveIterator
 import base64
 import argparse
-import cchardet
 import magic
-import re
 from bs4 import BeautifulSoup
 import os
-import importlib
 import logging
 import lzma
-import gzip
 from selectolax.parser import HTMLParser
 from html.parser import HTMLParser as HTMLTokenizer
 import mmh3
+import numpy as np
 import sys
 import html5lib
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from lxml import etree
 
-
-def remove_control_characters(html):
-    # type: (t.Text) -> t.Text
-    """
-    Strip invalid XML characters that `lxml` cannot parse.
-    """
-    # See: https://github.com/html5lib/html5lib-python/issues/96
-    #
-    # The XML 1.0 spec defines the valid character range as:
-    # Char ::= #x9 | #xA | #xD | [#x20-#xD7FF] | [#xE000-#xFFFD] | [#x10000-#x10FFFF]
-    #
-    # We can instead match the invalid characters by inverting that range into:
-    # InvalidChar ::= #xb | #xc | #xFFFE | #xFFFF | [#x0-#x8] | [#xe-#x1F] | [#xD800-#xDFFF]
-    #
-    # Sources:
-    # https://www.w3.org/TR/REC-xml/#charsets,
-    # https://lsimons.wordpress.com/2011/03/17/stripping-illegal-characters-out-of-xml-in-python/
-    def strip_illegal_xml_characters(s, default, base=10):
-        # Compare the "invalid XML character range" numerically
-        n = int(s, base)
-        if n in (0xb, 0xc, 0xFFFE, 0xFFFF) or 0x0 <= n <= 0x8 or 0xe <= n <= 0x1F or 0xD800 <= n <= 0xDFFF:
-            return ""
-        return default
-
-    # We encode all non-ascii characters to XML char-refs, so for example "💖" becomes: "&#x1F496;"
-    # Otherwise we'd remove emojis by mistake on narrow-unicode builds of Python
-    html = html.decode('utf8').encode("ascii", "xmlcharrefreplace").decode("utf-8")
-    html = re.sub(r"&#(\d+);?", lambda c: strip_illegal_xml_characters(c.group(1), c.group(0)), html)
-    html = re.sub(
-        r"&#[xX]([0-9a-fA-F]+);?",
-        lambda c: strip_illegal_xml_characters(
-            c.group(1),
-            c.group(0),
-            base=16
-        ),
-        html)
-    html = ILLEGAL_XML_CHARS_RE.sub("", html)
-    return html
-
-
-# A regex matching the "invalid XML character range"
-ILLEGAL_XML_CHARS_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1F\uD800-\uDFFF\uFFFE\uFFFF]")
+from bitextor.utils.boilerplate import load_boilerplate_remover
+from bitextor.utils.common import batched, bounded_imap, log_throughput
+from bitextor.utils.encoding import convert_encoding
+from bitextor.utils.hashstore import HashStore, load_hash_index, merge_hash_index
+from bitextor.utils.langid import load_language_identifier
+from bitextor.utils.normalize import normalize_plain_text, strip_illegal_xml
+from bitextor.utils.record_filter import FilterChain, record_filters
+from bitextor.utils.warcindex import iter_range, parse_byte_range
+from bitextor.utils.writers import CompressionPool
 
 
 class SimpleParser(HTMLTokenizer):
-    startendNL = [
+    """
+    Text extraction with the HTML tokenizer of the standard library. The text is collected in a list and joined once,
+    so extraction time is linear in the size of the document
+    """
+    startendNL = frozenset([
         "ul",
         "ol",
         "dl",
@@ -111,405 +81,744 @@ class SimpleParser(HTMLTokenizer):
         "main",
         "nav",
         "pre",
-        "section"]
-    selfNL = ["br", "hr"]
-    noText = ["script", "noscript", "style"]
-    lastTok = ""
-    parsed = ""
+        "section"])
+    selfNL = frozenset(["br", "hr"])
+    startNL = startendNL | selfNL
+    noText = frozenset(["script", "noscript", "style"])
+
+    def __init__(self):
+        super().__init__()
+        self.lastTok = ""
+        self.parsed = []
 
     def handle_starttag(self, tag, attrs):
-        if tag in self.startendNL or tag in self.selfNL:
-            self.parsed = self.parsed + "\n"
+        if tag in self.startNL:
+            self.parsed.append("\n")
         self.lastTok = tag
 
     def handle_endtag(self, tag):
         if tag in self.startendNL:
-            self.parsed = self.parsed + "\n"
+            self.parsed.append("\n")
         else:
-            self.parsed = self.parsed + " "
+            self.parsed.append(" ")
 
     def handle_startendtag(self, tag, attrs):
         if tag in self.selfNL:
-            self.parsed = self.parsed + "\n"
+            self.parsed.append("\n")
 
     def handle_data(self, data):
         if self.lastTok not in self.noText:
-            newdata = data.replace("\r\n", " ").replace("\n", " ")
-            self.parsed = self.parsed + newdata
+            self.parsed.append(data.replace("\r\n", " ").replace("\n", " "))
 
     def get_text(self):
-        return self.parsed.strip() + "\n"
+        return "".join(self.parsed).strip() + "\n"
 
 
-def guess_lang_from_data2(data):
-    reliable, text_bytes, detected_languages = cld2.detect(
-        ''.join(x for x in data if x.isprintable()), isPlainText=False)
-    return detected_languages[0][1]
+def tree_text(root, separator="", skip=frozenset(["script", "style", "img"])):
+    """
+    Text of an lxml tree (e.g. parsed by html5lib) without the contents of comments and skip elements, with the
+    text nodes joined by separator, the same as BeautifulSoup and selectolax return after removing the skip elements
+    """
+    texts = []
+    walker = etree.iterwalk(root, events=("start", "end", "comment", "pi"))
+    for event, element in walker:
+        if event == "start":
+            if element.tag in skip:
+                walker.skip_subtree()
+            elif element.text:
+                texts.append(element.text)
+        elif element.tail and element is not root:
+            texts.append(element.tail)
+    return separator.join(texts)
+
+
+ProcessedDocument = namedtuple(
+    "ProcessedDocument",
+    ["url", "date", "record_id", "orig_encoding", "lang", "mime", "text", "deboiled", "plaintext", "html_hash",
+     "plaintext_hash"])
+
+
+def parse_langs(langs, l1=None, l2=None):
+    """
+    Parse a list of languages to include or ignore (%): l1,l2,%l3,%l4. If languages are specified, l1 and l2 are
+    added to them. Returns the (languages, banned) lists
+    """
+    languages = []
+    banned = []
 
+    if langs:
+        for l in langs.split(','):
+            if l[0] == '+':
+                languages.append(l[1:])
+            elif l[0] == '%':
+                banned.append(l[1:])
+            else:
+                languages.append(l)
 
-def guess_lang_from_data3(model, data):
-    language, probability, reliable, proportion = model.get_language(data)
-    return language
+    # make sure that if languages are specified, lang1 and lang2 are among them
+    if languages:
+        if l1 is not None:
+            languages.append(l1)
+        if l2 is not None:
+            languages.append(l2)
 
+    return languages, banned
 
-def convert_encoding(data):
-    encoding = cchardet.detect(data)['encoding']
-    if encoding is None:
-        encoding = "utf-8"
-    if len(data) > 0:
-        # We convert, even if the text is detected to be UTF8 so,
-        # if it is an error and conversion fails, the error is caught here
-        for enc in [encoding, 'utf-8', 'iso-8859-1', 'windows‑1252']:
-            try:
-                return enc, data.decode(enc)
-            except BaseException:
-                pass
-    return None, ''
 
+def read_payload(state):
+    state["payload"] = state["record"].content_stream().read()
+    return len(state["payload"]) > 0
 
-def open_xz_or_gzip(path, mode):
-    if path[-3:] == '.gz':
-        return gzip.open(path, mode)
-    elif path[-3:] == '.xz':
-        return lzma.open(path, mode)
-    else:
-        return open(path, mode)
-
-
-def open_output_files(options, lang, files_dict):
-    if not options.xzlang and lang not in files_dict:
-        if not os.path.exists(f"{options.outDir}/{lang}"):
-            os.makedirs(f"{options.outDir}/{lang}")
-        urlFile = open_xz_or_gzip(f"{options.outDir}/{lang}/url.{options.compression}", "w")
-        encodingFile = open_xz_or_gzip(f"{options.outDir}/{lang}/encoding.{options.compression}", "w")
-        mimeFile = open_xz_or_gzip(f"{options.outDir}/{lang}/mime.{options.compression}", "w")
-        normHtmlFile = open_xz_or_gzip(f"{options.outDir}/{lang}/normalized_html.{options.compression}", "w")
-        plainTextFile = open_xz_or_gzip(f"{options.outDir}/{lang}/plain_text.{options.compression}", "w")
-        if options.boilerpipe:
-            deboilFile = open_xz_or_gzip(f"{options.outDir}/{lang}/deboilerplate_html.{options.compression}", "w")
-            files_dict[lang] = {
-                "urlFile": urlFile,
-                "encodingFile": encodingFile,
-                "mimeFile": mimeFile,
-                "normHtmlFile": normHtmlFile,
-                "plainTextFile": plainTextFile,
-                "deboilFile": deboilFile
-            }
-        else:
-            if not os.path.exists(f"{options.outDir}/{lang}/deboilerplate_html.{options.compression}") \
-                    and not os.path.islink(f"{options.outDir}/{lang}/deboilerplate_html.{options.compression}"):
-                os.symlink(
-                    f"normalized_html.{options.compression}",
-                    f"{options.outDir}/{lang}/deboilerplate_html.{options.compression}"
-                )
-            files_dict[lang] = {
-                "urlFile": urlFile,
-                "encodingFile": encodingFile,
-                "mimeFile": mimeFile,
-                "normHtmlFile": normHtmlFile,
-                "plainTextFile": plainTextFile}
-
-
-oparser = argparse.ArgumentParser(
-    description="Script that takes every record in a WARC file and runs preprocessing, which includes: HTML"
-                "normalization, deduplication, MIME and language identification, and boilerplate removing. The result"
-                "of each pre-processing step is stored in a XZ compressed file in the output directory.")
-oparser.add_argument("--verbose", action="store_true", default=False,
-                     help="Produce additional information about preprocessing through stderr.")
-oparser.add_argument("--boilerpipe", action="store_true", default=False,
-                     help="Use boilerpipe bodytext to do the de-boiling")
-oparser.add_argument("--parser", dest="parser", default="bs4", choices={'bs4', 'modest', 'lxml', 'simple'},
-                     help="Use 'HTML tokenizer', 'modest', 'bs4' or 'lxml' (using html5lib tree) parser to extract relevant text from HTML. By default 'bs4' is used")
-oparser.add_argument("--html5lib", action="store_true", default=False, help="Process HTML tree with html5lib")
-oparser.add_argument('--output-dir', dest='outDir', help='Output directory', required=True)
-oparser.add_argument('--output_hash', dest='outputHash', help='Output path for Murmur Hash of plain texts')
-oparser.add_argument('--input_hash', dest='inputHash',
-                     help='Input path for previous Bitextor Murmur Hash plain texts file')
-oparser.add_argument('--lang1', dest='l1', help='Language l1 in the crawl', default=None)
-oparser.add_argument('--lang2', dest='l2', help='Language l2 in the crawl', default=None)
-oparser.add_argument('--input', dest='input', help='Input WARC file', default=sys.stdin)
-oparser.add_argument('--xzlang', action="store_true", help='Separate output into different files by language',
-                     default=False)
-oparser.add_argument('--langs', dest="langs", default="",
-                     help='List of languages to include or ignore (%%): l1,l2,%%l3,%%l4')
-oparser.add_argument('--langid', dest="langid", default="cld2", help="Model used for language detection: cld2 or cld3")
-oparser.add_argument('--compression', dest='compression', default='gz', choices={'xz', 'gz'},
-                     help='Compression type for the output files')
-options = oparser.parse_args()
-
-logging.basicConfig(
-    format='%(asctime)s %(levelname)-8s %(message)s',
-    level=logging.INFO if options.verbose else logging.ERROR,
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-
-if options.input == sys.stdin or options.input == '-':
-    f = ArchiveIterator(sys.stdin.buffer)
-elif options.input[-3:] == ".xz":
-    f = ArchiveIterator(lzma.open(options.input, 'r'))
-elif options.input[-3:] == ".gz":
-    f = ArchiveIterator(open(options.input, 'rb'))
-else:
-    f = ArchiveIterator(open(options.input, 'r'))
-
-seen_html = set()
-seen_plain_text = set()
-
-magic.Magic(mime=True)
-
-languages = []
-banned = []
-if options.langid == "cld3":
-    import cld3
-    cld3model = cld3.LanguageIdentifier()
-else:
-    import pycld2 as cld2
-
-if options.langs:
-    for l in options.langs.split(','):
-        if l[0] == '+':
-            languages.append(l[1:])
-        elif l[0] == '%':
-            banned.append(l[1:])
-        else:
-            languages.append(l)
-
-# make sure that if languages are specified, lang1 and lang2 are among them
-if languages:
-    if options.l1 is not None:
-        languages.append(options.l1)
-    if options.l2 is not None:
-        languages.append(options.l2)
-
-previous_crawl_hashes = set()
-
-if not os.path.exists(options.outDir):
-    os.makedirs(options.outDir)
-
-if options.inputHash:
-    with open_xz_or_gzip(options.inputHash, 'r') as fh:
-        for line in fh:
-            previous_crawl_hashes.add(int(line.strip()))
-
-plainTextHashFile = None
-if options.outputHash:
-    plainTextHashFile = open_xz_or_gzip(options.outputHash, "w")
-
-files_dict = dict()
-
-ExtrB = None
-if options.boilerpipe:
-    import jpype
-    if not jpype.isJVMStarted():
-        jars = []
-        for top, dirs, files in os.walk(
-            os.path.dirname(importlib.machinery.PathFinder().find_module("boilerpipe").get_filename()) + '/data'
-        ):
-            for nm in files:
-                if nm[-4:] == ".jar":
-                    jars.append(os.path.join(top, nm))
-        jpype.addClassPath(os.pathsep.join(jars))
-        jpype.startJVM(jpype.getDefaultJVMPath(), convertStrings=False)
-    from boilerpipe.extract import Extractor as ExtrB
-
-for record in f:
-    plaintext = ""
-    # Initial checks
-    if record.rec_type != 'response' and record.rec_type != 'resource':
-        continue
-    if record.rec_headers.get_header('WARC-Target-URI')[0] == '<' \
-            and record.rec_headers.get_header('WARC-Target-URI')[-1] == '>':
-        url = record.rec_headers.get_header('WARC-Target-URI')[1:-1]
+
+def open_archive(input, byte_range=None):
+    """
+    Iterate the records of a WARC given as a path or '-' for stdin. byte_range is a (start, end) tuple of offsets of
+    the records to read, see warcindex
+    """
+    if byte_range:
+        return iter_range(input, *byte_range)
+    elif input == sys.stdin or input == '-':
+        return ArchiveIterator(sys.stdin.buffer)
+    elif input[-3:] == ".xz":
+        return ArchiveIterator(lzma.open(input, 'r'))
+    elif input[-3:] == ".gz":
+        return ArchiveIterator(open(input, 'rb'))
     else:
-        url = record.rec_headers.get_header('WARC-Target-URI')
-    if url == "unknown":
-        logging.info("Skipping page with unknown URL")
-        continue
-    url = url.lower()
-    url = url.replace('\t', ' ')
-    if url[-4:] == ".gif" or url[-4:] == ".jpg" or url[-5:] == ".jpeg" or url[-4:] == ".png" or url[-4:] == ".css" \
-            or url[-3:] == ".js" or url[-4:] == ".mp3" or url[-4:] == ".mp4" or url[-4:] == ".ogg" \
-            or url[-5:] == ".midi" or url[-4:] == ".swf":
-        continue
-
-    # Ignore robots.txt when processing records
-    if url[-11:] == "/robots.txt":
-        continue
-
-    payload = record.content_stream().read()
-
-    # We convert into UTF8 first of all
-    orig_encoding, text = convert_encoding(payload)
-
-    # Fix HTML issues with html5lib if activated through parameters
-    if options.html5lib or options.parser == "lxml":
-        document = html5lib.parse(remove_control_characters(bytes(text, 'utf8')),
-                                  treebuilder="lxml", namespaceHTMLElements=False)
-        text = etree.tostring(document, encoding="utf8").decode('utf8')
-
-    logging.info("Processing document: " + url)
-    if orig_encoding is None:
-        logging.info("Encoding of document " + url + " could not be identified")
-        continue
-
-    date = record.rec_headers.get_header('WARC-Date')
-    recordId = record.rec_headers.get_header('WARC-Record-ID')
-
-    if len(text.strip()) == 0:
-        continue
-
-    # lang id
-    logging.info(url + ": detecting language")
-    lang = ""
-
-    if options.langid == "cld2":
-        lang = guess_lang_from_data2(text)
-        if (len(languages) > 0 and lang not in languages) or (lang in banned):
+        return ArchiveIterator(open(input, 'rb'))
+
+
+class Warc2Preprocessor(object):
+    """
+    Preprocessing of WARC records: HTML normalization, deduplication, MIME and language identification, boilerplate
+    removing and text extraction. The output of every step is written to files in an output directory, per language.
+
+    Language identification models and boilerplate removers (e.g. the JVM of boilerpipe) are loaded once and kept for the whole life of the
+    object, and so are the deduplication sets (see reset_seen), so the same object can process any number of WARCs:
+
+        preprocessor = Warc2Preprocessor(langs="en,fr")
+        for warc in warcs:
+            preprocessor.open_output(output_dir)
+            preprocessor.process_stream(warc)
+            preprocessor.close_output()
+        preprocessor.close()
+    """
+
+    def __init__(self, boilerplate=None, parser="bs4", html5lib=False, langs="", l1=None, l2=None, langid="cld2",
+                 langid_model=None, langid_sample=65536, input_hash=None, hash_index=None, xzlang=False,
+                 compression="gz", workers=1, batch_size=64, max_size=0, xzlang_flush=0, compression_level=None,
+                 compression_threads=2):
+        self.boilerplate = boilerplate
+        self.parser = parser
+        self.html5lib = html5lib
+        self.langs = langs
+        self.l1 = l1
+        self.l2 = l2
+        self.langid = langid
+        self.langid_model = langid_model
+        self.langid_sample = langid_sample
+        self.input_hash = input_hash
+        self.hash_index = hash_index
+        self.xzlang = xzlang
+        self.xzlang_flush = xzlang_flush
+        self.xzlang_written = Counter()
+        self.compression = compression
+        self.compression_level = compression_level
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_size = max_size
+
+        self.languages, self.banned = parse_langs(langs, l1, l2)
+
+        self.seen_html = HashStore()
+        self.seen_plain_text = HashStore()
+        self.seen_payloads = HashStore(dtype=np.uint64)
+
+        self.record_filter = FilterChain(record_filters(max_size) + [("empty payload", read_payload),
+                                                                     ("duplicate payload", self.filter_payload)])
+
+        # hashes of previous crawls: memory-mapped if they are stored in a .npy hash index
+        previous_hashes = []
+        if input_hash:
+            previous_hashes.append(load_hash_index(input_hash))
+        if hash_index:
+            previous_hashes.append(load_hash_index(hash_index))
+        self.previous_crawl_hashes = HashStore(base=previous_hashes)
+
+        magic.Magic(mime=True)
+
+        # models are loaded the first time a document is processed (never in the main process if there are workers)
+        self.models_loaded = False
+        self.identifier = None
+        self.boilerplate_remover = None
+        self.langid_stats = Counter()
+        self.boilerplate_stats = Counter()
+
+        self.executor = None
+        # output files are compressed in background threads
+        self.compression_pool = CompressionPool(threads=compression_threads)
+
+        self.out_dir = None
+        self.input_name = ""
+        self.files_dict = dict()
+        self.plain_text_hash_file = None
+
+    def config(self):
+        return dict(boilerplate=self.boilerplate, parser=self.parser, html5lib=self.html5lib, langs=self.langs,
+                    l1=self.l1, l2=self.l2, langid=self.langid, langid_model=self.langid_model,
+                    langid_sample=self.langid_sample, xzlang=self.xzlang, compression=self.compression)
+
+    def load_models(self):
+        if self.models_loaded:
+            return
+
+        self.identifier = load_language_identifier(self.langid, self.langid_sample, self.langid_model)
+
+        if self.boilerplate:
+            self.boilerplate_remover = load_boilerplate_remover(self.boilerplate)
+
+        self.models_loaded = True
+
+    def open_output(self, out_dir, output_hash=None, input_name=""):
+        """
+        Start writing the preprocessed documents to out_dir. The MurmurHash of every written plain text is stored in
+        output_hash, if provided. input_name is the WARC name written in the headers of the files of --xzlang
+        """
+        self.close_output()
+
+        self.out_dir = out_dir
+        self.input_name = input_name
+
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+
+        if output_hash:
+            self.plain_text_hash_file = self.compression_pool.open(output_hash, level=self.compression_level)
+
+    def close_output(self):
+        for lang in self.files_dict:
+            for output_file in self.files_dict[lang].values():
+                output_file.close()
+        self.files_dict = dict()
+
+        if self.plain_text_hash_file:
+            self.plain_text_hash_file.close()
+            self.plain_text_hash_file = None
+
+        self.out_dir = None
+
+    def reset_seen(self):
+        """
+        Forget the documents written so far, so the next WARCs are not deduplicated against them
+        """
+        self.seen_html = HashStore()
+        self.seen_plain_text = HashStore()
+        self.seen_payloads = HashStore(dtype=np.uint64)
+
+    def merge_hash_index(self):
+        """
+        Merge the hashes of the plain texts written so far into the hash index, so the next runs skip them.
+        Call it once the WARCs have been successfully processed
+        """
+        if self.hash_index:
+            merge_hash_index(self.hash_index, self.seen_plain_text.added())
+
+    def report(self):
+        self.record_filter.report()
+        log_throughput(f"Language identification ({self.langid})", self.langid_stats)
+        log_throughput(f"Boilerplate removal ({self.boilerplate})", self.boilerplate_stats)
+
+    def close(self):
+        self.close_output()
+        self.compression_pool.shutdown()
+
+        if self.executor:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open_output_file(self, path):
+        return self.compression_pool.open(path, compression=self.compression, level=self.compression_level)
+
+    def open_output_files(self, lang):
+        if lang in self.files_dict:
+            return
+
+        if self.xzlang:
+            # appended as new xz streams, which is still a valid xz file
+            self.files_dict[lang] = {"langFile": self.compression_pool.open(f"{self.out_dir}/{lang}", mode="ab",
+                                                                            compression="xz",
+                                                                            level=self.compression_level)}
+            return
+
+        out_dir = self.out_dir
+        compression = self.compression
+        if not os.path.exists(f"{out_dir}/{lang}"):
+            os.makedirs(f"{out_dir}/{lang}")
+        files = {
+            "urlFile": self.open_output_file(f"{out_dir}/{lang}/url.{compression}"),
+            "encodingFile": self.open_output_file(f"{out_dir}/{lang}/encoding.{compression}"),
+            "mimeFile": self.open_output_file(f"{out_dir}/{lang}/mime.{compression}"),
+            "normHtmlFile": self.open_output_file(f"{out_dir}/{lang}/normalized_html.{compression}"),
+            "plainTextFile": self.open_output_file(f"{out_dir}/{lang}/plain_text.{compression}")
+        }
+        if self.boilerplate:
+            files["deboilFile"] = self.open_output_file(f"{out_dir}/{lang}/deboilerplate_html.{compression}")
+        elif not os.path.exists(f"{out_dir}/{lang}/deboilerplate_html.{compression}") \
+                and not os.path.islink(f"{out_dir}/{lang}/deboilerplate_html.{compression}"):
+            os.symlink(
+                f"normalized_html.{compression}",
+                f"{out_dir}/{lang}/deboilerplate_html.{compression}"
+            )
+        self.files_dict[lang] = files
+
+    def filter_payload(self, state):
+        """
+        Reject the records whose raw payload (and HTTP Content-Type, which can change its decoding) has been seen
+        before in this WARC: they would produce the same document, so they are discarded before decoding it
+        """
+        payload_hash = mmh3.hash64(state["payload"], signed=False)[0] ^ mmh3.hash64(state["content_type"] or "",
+                                                                                     signed=False)[0]
+        if payload_hash in self.seen_payloads:
+            logging.info("Repeated payload:\t" + state["url"])
+            return False
+        self.seen_payloads.add(payload_hash)
+        return True
+
+    def read_document(self, record):
+        """
+        Run the filter chain on a record and return its (url, payload, date, record id, HTTP Content-Type) if it has
+        to be processed, or None otherwise
+        """
+        state = {"record": record}
+        if not self.record_filter(state):
+            return None
+
+        date = record.rec_headers.get_header('WARC-Date')
+        recordId = record.rec_headers.get_header('WARC-Record-ID')
+
+        return state["url"], state["payload"], date, recordId, state["content_type"]
+
+    def accepted_language(self, lang, url):
+        if (len(self.languages) > 0 and lang not in self.languages) or (lang in self.banned):
             logging.info("Language of document " + url + ": " + lang + ". Not among searched languages.")
-            continue
+            return False
         if lang == "un":
             logging.info("Language of document " + url + " could not be identified")
-            continue
-        open_output_files(options, lang, files_dict)
-
-    # If enabled, remove boilerplate HTML
-    if options.boilerpipe:
-        logging.info(url + ": deboiling html")
-        extractor = ExtrB(extractor='ArticleExtractor', html=text)
-        deboiled = str(extractor.getHTML())
-    else:
-        deboiled = text
-
-    # We compute a hash on the HTML (either normalized one or after boilerpipe if enabled):
-    # if we get duplicate files we discard them
-    html_hash = mmh3.hash(deboiled, signed=False)
-    # checking for duplicate content (duplicates are discarded)
-    if html_hash in seen_html:
-        logging.info("Repeated file:\t" + url)
-        continue
-
-    # get text with beautifulsoup
-    if options.parser == "bs4":
-        logging.info(url + ": Getting text with BeautifulSoup")
-        try:
-            soup = BeautifulSoup(deboiled, "lxml")
-        except Exception as ex:
-            logging.info("Exception ocurred when processing " + url + " with BeautifulSoup")
-            continue
-
-        for script in soup(["script", "style", "img"]):
-            script.extract()  # rip it out
-        plaintext = soup.get_text()
-
-    # or get text with 'modest' library
-    elif options.parser == "modest":
-        logging.info(url + ": Getting text with modest (selectolax)")
-        try:
-            tree = HTMLParser(deboiled)
-        except BaseException:
-            logging.info("Tree structure issues in HTML/XML. Ignoring this document")
-            continue
-        for tag in tree.css('script'):
-            tag.decompose()
-        for tag in tree.css('style'):
-            tag.decompose()
-        for tag in tree.css('img'):
-            tag.decompose()
-        if tree.body is None:
-            logging.info("Body is empty. Ignoring this document")
-            continue
-        plaintext = tree.body.text(separator='\n')
-
-    # or get text by moving through the lxml tree
-    elif options.parser == "lxml":
-        from standoff import deferred_document
-        logging.info(url + ": Getting text with lxml")
-        standoff_document, plaintext = deferred_document.getDocumentStandoff(
-            html5lib.parse(text, treebuilder="lxml", namespaceHTMLElements=False))
-
-    # or use an HTML tokenizer
-    else:
-        logging.info(url + ": Getting text with HTML tokenizer")
-        parser = SimpleParser()
-        try:
-            parser.feed(text)
-            plaintext = parser.get_text()
-        except BaseException:
-            logging.info("Tree structure issues in HTML/XML. Ignoring this document")
-            continue
-    plaintext = re.sub(r"\n+", "\n",
-                       re.sub(r" *\n *", "\n",
-                              re.sub(r"[ \t\v\f]+", " ",
-                                     re.sub(r"\r", "",
-                                            plaintext.replace(u'\xa0', u' '))))).strip()
-    if options.langid == "cld3":
-        if plaintext:
-            lang = guess_lang_from_data3(cld3model, plaintext)
-            if (len(languages) > 0 and lang not in languages) or (lang in banned):
-                logging.info("Language of document " + url + ": " + lang + ". Not among searched languages.")
-                continue
-            if lang == "un":
-                logging.info("Language of document " + url + " could not be identified")
-                continue
-            open_output_files(options, lang, files_dict)
+            return False
+        return True
+
+    def decode_document(self, document):
+        """
+        Convert a document, as returned by read_document, to UTF8 and normalize it with html5lib if needed.
+        Returns the state of the document through the next steps (a dict), or None if it has to be discarded
+        """
+        url, payload, date, recordId, content_type = document
+
+        # We convert into UTF8 first of all
+        orig_encoding, text = convert_encoding(payload, content_type)
+
+        # Fix HTML issues with html5lib if activated through parameters. The tree is kept, so the text is extracted
+        # from it instead of parsing the normalized HTML again
+        tree = None
+        if self.html5lib or self.parser == "lxml":
+            tree = html5lib.parse(strip_illegal_xml(text), treebuilder="lxml", namespaceHTMLElements=False)
+            text = etree.tostring(tree, encoding="utf8").decode('utf8')
+
+        logging.info("Processing document: " + url)
+        if orig_encoding is None:
+            logging.info("Encoding of document " + url + " could not be identified")
+            return None
+
+        if len(text.strip()) == 0:
+            return None
+
+        return {"url": url, "date": date, "record_id": recordId, "orig_encoding": orig_encoding, "text": text,
+                "lang": "", "tree": tree}
+
+    def identify_languages(self, docs, field):
+        """
+        Identify the language of the given field of a batch of documents. Documents in languages that are not among
+        the searched ones are replaced by None
+        """
+        idxs = [i for i, doc in enumerate(docs) if doc is not None]
+        if not idxs:
+            return
+
+        for i in idxs:
+            logging.info(docs[i]["url"] + ": detecting language")
+        langs = self.identifier.identify([docs[i][field] for i in idxs])
+
+        for i, lang in zip(idxs, langs):
+            if self.accepted_language(lang, docs[i]["url"]):
+                docs[i]["lang"] = lang
+            else:
+                docs[i] = None
+
+    def remove_boilerplate(self, docs):
+        """
+        Remove the boilerplate of the HTML of a batch of documents. Documents that cannot be processed are replaced
+        by None
+        """
+        idxs = [i for i, doc in enumerate(docs) if doc is not None]
+        if not idxs:
+            return
+
+        for i in idxs:
+            logging.info(docs[i]["url"] + ": deboiling html")
+        deboiled = self.boilerplate_remover.remove_boilerplate([docs[i]["text"] for i in idxs])
+
+        for i, html_deboiled in zip(idxs, deboiled):
+            if html_deboiled is None:
+                docs[i] = None
+            else:
+                docs[i]["deboiled"] = html_deboiled
+
+    def extract_text(self, doc, check_duplicates=True):
+        """
+        Remove boilerplate (if enabled) and extract the plain text of a decoded document.
+        Returns the document, or None if it has to be discarded
+        """
+        url = doc["url"]
+        text = doc["text"]
+
+        # HTML without boilerplate, if enabled
+        deboiled = doc.get("deboiled", text)
+        # html5lib tree of the normalized HTML, if any
+        document_tree = doc.pop("tree")
+
+        # We compute a hash on the HTML (either normalized one or after boilerplate removal if enabled):
+        # if we get duplicate files we discard them
+        html_hash = mmh3.hash(deboiled, signed=False)
+        # checking for duplicate content (duplicates are discarded)
+        if check_duplicates and html_hash in self.seen_html:
+            logging.info("Repeated file:\t" + url)
+            return None
+
+        # get text with beautifulsoup
+        if self.parser == "bs4" and document_tree is not None and deboiled is text:
+            logging.info(url + ": Getting text from html5lib tree")
+            # BeautifulSoup leaves the contents of <template> out of its text too
+            plaintext = tree_text(document_tree.getroot(), skip=frozenset(["script", "style", "img", "template"]))
+        elif self.parser == "bs4":
+            logging.info(url + ": Getting text with BeautifulSoup")
+            try:
+                soup = BeautifulSoup(deboiled, "lxml")
+            except Exception as ex:
+                logging.info("Exception ocurred when processing " + url + " with BeautifulSoup")
+                return None
+
+            for script in soup(["script", "style", "img"]):
+                script.extract()  # rip it out
+            plaintext = soup.get_text()
+
+        # or get text with 'modest' library
+        elif self.parser == "modest" and document_tree is not None and deboiled is text:
+            logging.info(url + ": Getting text from html5lib tree")
+            plaintext = tree_text(document_tree.getroot().find("body"), separator='\n')
+        elif self.parser == "modest":
+            logging.info(url + ": Getting text with modest (selectolax)")
+            try:
+                tree = HTMLParser(deboiled)
+            except BaseException:
+                logging.info("Tree structure issues in HTML/XML. Ignoring this document")
+                return None
+            for tag in tree.css('script'):
+                tag.decompose()
+            for tag in tree.css('style'):
+                tag.decompose()
+            for tag in tree.css('img'):
+                tag.decompose()
+            if tree.body is None:
+                logging.info("Body is empty. Ignoring this document")
+                return None
+            plaintext = tree.body.text(separator='\n')
+
+        # or get text by moving through the lxml tree
+        elif self.parser == "lxml":
+            from standoff import deferred_document
+            logging.info(url + ": Getting text with lxml")
+            standoff_document, plaintext = deferred_document.getDocumentStandoff(document_tree)
+
+        # or use an HTML tokenizer
         else:
-            continue
-
-    plaintext_hash = mmh3.hash(plaintext, signed=False)
-
-    if plaintext_hash in seen_plain_text or plaintext_hash in previous_crawl_hashes:
-        logging.info("Repeated plain text file:\t" + url)
-        continue
-
-    if len(plaintext) > 0:
+            logging.info(url + ": Getting text with HTML tokenizer")
+            parser = SimpleParser()
+            try:
+                parser.feed(text)
+                plaintext = parser.get_text()
+            except BaseException:
+                logging.info("Tree structure issues in HTML/XML. Ignoring this document")
+                return None
+        plaintext = normalize_plain_text(plaintext)
+        if not plaintext:
+            return None
+
+        doc["deboiled"] = deboiled
+        doc["html_hash"] = html_hash
+        doc["plaintext"] = plaintext
+        return doc
+
+    def finish_document(self, doc, check_duplicates=True):
+        """
+        Hash the plain text and guess the MIME type of a document whose text has been extracted.
+        Returns a ProcessedDocument, or None if the document has to be discarded
+        """
+        url = doc["url"]
+        plaintext_hash = mmh3.hash(doc["plaintext"], signed=False)
+
+        if check_duplicates and (plaintext_hash in self.seen_plain_text
+                                 or plaintext_hash in self.previous_crawl_hashes):
+            logging.info("Repeated plain text file:\t" + url)
+            return None
 
-        seen_html.add(html_hash)
-        seen_plain_text.add(plaintext_hash)
         # Guessing MIME of the file (checked on original content)
         logging.info(url + ": Getting mime")
-        mime = magic.from_buffer(text, mime=True)
-
-        if not options.xzlang:
-            files_dict[lang]["mimeFile"].write(mime.encode() + b"\n")
-            files_dict[lang]["urlFile"].write(url.encode() + b"\n")
-            files_dict[lang]["encodingFile"].write(orig_encoding.encode() + b"\n")
-
-            b64norm = base64.b64encode(text.encode())
-            files_dict[lang]["normHtmlFile"].write(b64norm + b"\n")
-
-            if options.boilerpipe:
-                b64deboil = base64.b64encode(deboiled.encode())
-                files_dict[lang]["deboilFile"].write(b64deboil + b"\n")
-
-            b64text = base64.b64encode(html.unescape(plaintext).encode())
-            files_dict[lang]["plainTextFile"].write(b64text + b"\n")
+        mime = magic.from_buffer(doc["text"], mime=True)
+
+        return ProcessedDocument(url, doc["date"], doc["record_id"], doc["orig_encoding"], doc["lang"], mime,
+                                 doc["text"], doc["deboiled"], doc["plaintext"], doc["html_hash"], plaintext_hash)
+
+    def process_documents(self, documents, check_duplicates=True):
+        """
+        Run the whole preprocessing of a batch of documents, as returned by read_document: encoding conversion,
+        normalization, language identification, boilerplate removal, text extraction and hashing. Language
+        identification is run once for the whole batch, on the HTML or on the plain text depending on the model.
+        Duplicates are only discarded here if check_duplicates is set, since the deduplication sets are not shared
+        with the workers: the final decision is always taken when the document is written.
+        Returns a list with a ProcessedDocument for every document, or None if it has to be discarded
+        """
+        self.load_models()
+
+        docs = [self.decode_document(document) for document in documents]
+        if not self.identifier.plain_text:
+            self.identify_languages(docs, "text")
+
+        if self.boilerplate_remover:
+            self.remove_boilerplate(docs)
+
+        docs = [self.extract_text(doc, check_duplicates) if doc else None for doc in docs]
+        if self.identifier.plain_text:
+            self.identify_languages(docs, "plaintext")
+
+        self.langid_stats += self.identifier.pop_stats()
+        if self.boilerplate_remover:
+            self.boilerplate_stats += self.boilerplate_remover.pop_stats()
+
+        return [self.finish_document(doc, check_duplicates) if doc else None for doc in docs]
+
+    def write_document(self, doc):
+        """
+        Check the processed document against the documents already written and, if it is not a duplicate, append it
+        to the output files of its language. Returns whether the document was written
+        """
+        if doc.html_hash in self.seen_html:
+            logging.info("Repeated file:\t" + doc.url)
+            return False
+        if doc.plaintext_hash in self.seen_plain_text or doc.plaintext_hash in self.previous_crawl_hashes:
+            logging.info("Repeated plain text file:\t" + doc.url)
+            return False
+
+        self.seen_html.add(doc.html_hash)
+        self.seen_plain_text.add(doc.plaintext_hash)
+        lang = doc.lang
+
+        if not self.xzlang:
+            self.open_output_files(lang)
+            files = self.files_dict[lang]
+            files["mimeFile"].write(doc.mime.encode() + b"\n")
+            files["urlFile"].write(doc.url.encode() + b"\n")
+            files["encodingFile"].write(doc.orig_encoding.encode() + b"\n")
+
+            b64norm = base64.b64encode(doc.text.encode())
+            files["normHtmlFile"].write(b64norm + b"\n")
+
+            if self.boilerplate:
+                b64deboil = base64.b64encode(doc.deboiled.encode())
+                files["deboilFile"].write(b64deboil + b"\n")
+
+            b64text = base64.b64encode(html.unescape(doc.plaintext).encode())
+            files["plainTextFile"].write(b64text + b"\n")
         # append to language specific file
         else:
-            langfile = lzma.open(options.outDir + "/" + lang, mode="a", format=lzma.FORMAT_XZ)
-            header = "Content-Location: " + url + "\n"
-            header += "Content-Type: " + mime + "\n"
+            self.open_output_files(lang)
+            langfile = self.files_dict[lang]["langFile"]
+            header = "Content-Location: " + doc.url + "\n"
+            header += "Content-Type: " + doc.mime + "\n"
             header += "Content-Language: " + lang + "\n"
-            header += "Content-Length: " + str(len(plaintext)) + "\n"
-            header += "Date: " + date + "\n"
-            header += "X-WARC-Record-ID: " + recordId + "\n"
-            header += "X-WARC-Filename: " + options.input + "\n"
+            header += "Content-Length: " + str(len(doc.plaintext)) + "\n"
+            header += "Date: " + doc.date + "\n"
+            header += "X-WARC-Record-ID: " + doc.record_id + "\n"
+            header += "X-WARC-Filename: " + self.input_name + "\n"
             langfile.write(header.encode())
             langfile.write(b"\n")
-            langfile.write(plaintext.encode())
+            langfile.write(doc.plaintext.encode())
             langfile.write(b"\n")
-            langfile.close()
-
-        if options.outputHash:
-            plainTextHashFile.write(str(plaintext_hash).encode() + b"\n")
-
-if not options.xzlang:
-    for lang in files_dict:
-        files_dict[lang]["urlFile"].close()
-        files_dict[lang]["encodingFile"].close()
-        files_dict[lang]["mimeFile"].close()
-        files_dict[lang]["normHtmlFile"].close()
-        files_dict[lang]["plainTextFile"].close()
-        if options.boilerpipe:
-            files_dict[lang]["deboilFile"].close()
-if options.outputHash:
-    plainTextHashFile.close()
+
+            # write every xzlang_flush documents as a finished xz stream, so they can be read even if the process is
+            # killed
+            if self.xzlang_flush:
+                self.xzlang_written[lang] += 1
+                if self.xzlang_written[lang] % self.xzlang_flush == 0:
+                    langfile.flush()
+
+        if self.plain_text_hash_file:
+            self.plain_text_hash_file.write(str(doc.plaintext_hash).encode() + b"\n")
+
+        return True
+
+    def process_record(self, record):
+        """
+        Preprocess a single WARC record (as read by warcio) in the current process and write it to the output.
+        Returns whether the record was written
+        """
+        document = self.read_document(record)
+        if document is None:
+            return False
+        doc = self.process_documents([document])[0]
+        if doc is None:
+            return False
+        return self.write_document(doc)
+
+    def process_stream(self, stream, byte_range=None):
+        """
+        Preprocess every record of a WARC, given either as a path, '-' for stdin or a binary file object, or only the
+        records in a (start, end) byte range of a WARC file.
+        Records are processed in batches. If there are several workers, batches are processed in a pool of processes
+        that is kept alive until close(), and written in the same order they were read.
+        Returns the number of written documents
+        """
+        if isinstance(stream, str):
+            archive = open_archive(stream, byte_range)
+        else:
+            archive = ArchiveIterator(stream)
+
+        documents = (document for document in map(self.read_document, archive) if document is not None)
+        batches = batched(documents, self.batch_size)
+
+        if self.workers > 1:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                                    initargs=(self.config(),))
+            results = bounded_imap(self.executor, process_in_worker, batches, window=self.workers * 2)
+        else:
+            results = map(self.process_documents, batches)
+
+        written = 0
+        for docs in results:
+            if self.workers > 1:
+                docs, langid_stats, boilerplate_stats = docs
+                self.langid_stats += langid_stats
+                self.boilerplate_stats += boilerplate_stats
+            for doc in docs:
+                if doc is not None and self.write_document(doc):
+                    written += 1
+
+        return written
+
+
+worker_preprocessor = None
+
+
+def init_worker(config):
+    global worker_preprocessor
+    worker_preprocessor = Warc2Preprocessor(**config)
+    worker_preprocessor.load_models()
+
+
+def process_in_worker(documents):
+    docs = worker_preprocessor.process_documents(documents, check_duplicates=False)
+    langid_stats, boilerplate_stats = worker_preprocessor.langid_stats, worker_preprocessor.boilerplate_stats
+    worker_preprocessor.langid_stats, worker_preprocessor.boilerplate_stats = Counter(), Counter()
+    return docs, langid_stats, boilerplate_stats
+
+
+def main():
+    oparser = argparse.ArgumentParser(
+        description="Script that takes every record in a WARC file and runs preprocessing, which includes: HTML"
+                    "normalization, deduplication, MIME and language identification, and boilerplate removing. The "
+                    "result of each pre-processing step is stored in a XZ compressed file in the output directory.")
+    oparser.add_argument("--verbose", action="store_true", default=False,
+                         help="Produce additional information about preprocessing through stderr.")
+    oparser.add_argument("--boilerpipe", dest="boilerplate", action="store_const", const="boilerpipe",
+                         help="Use boilerpipe bodytext to do the de-boiling (same as --boilerplate boilerpipe)")
+    oparser.add_argument("--boilerplate", dest="boilerplate", default=None, choices={'boilerpipe', 'density'},
+                         help="Remove boilerplate with boilerpipe (ArticleExtractor, run in a JVM) or 'density' (pure "
+                              "Python, same rules as boilerpipe on word counts and link density, much faster)")
+    oparser.add_argument("--parser", dest="parser", default="bs4", choices={'bs4', 'modest', 'lxml', 'simple'},
+                         help="Use 'HTML tokenizer', 'modest', 'bs4' or 'lxml' (using html5lib tree) parser to extract relevant text from HTML. By default 'bs4' is used")
+    oparser.add_argument("--html5lib", action="store_true", default=False, help="Process HTML tree with html5lib")
+    oparser.add_argument('--output-dir', dest='outDir', help='Output directory', required=True)
+    oparser.add_argument('--output_hash', dest='outputHash', help='Output path for Murmur Hash of plain texts')
+    oparser.add_argument('--input_hash', dest='inputHash',
+                         help='Input path for previous Bitextor Murmur Hash plain texts file (one hash per line or '
+                              'a .npy hash index)')
+    oparser.add_argument('--hash-index', dest='hashIndex',
+                         help='Hash index (.npy) of plain texts processed in previous runs: documents found in it are '
+                              'discarded, and the plain texts written in this run are merged into it at the end')
+    oparser.add_argument('--lang1', dest='l1', help='Language l1 in the crawl', default=None)
+    oparser.add_argument('--lang2', dest='l2', help='Language l2 in the crawl', default=None)
+    oparser.add_argument('--input', dest='input', help='Input WARC file', default=sys.stdin)
+    oparser.add_argument('--byte-range', dest='byteRange', default=None,
+                         help='Only process the records of the input WARC file that start in the byte range START-END '
+                              '(END can be empty), where START is the offset of a record in its index '
+                              '(see bitextor_warcindex.py)')
+    oparser.add_argument('--xzlang', action="store_true", help='Separate output into different files by language',
+                         default=False)
+    oparser.add_argument('--xzlang-flush', dest='xzlangFlush', type=int, default=0,
+                         help='With --xzlang, compress and write the pending documents of a language each time '
+                              'this number of documents has been written to it, so they can be read even if the '
+                              'process is killed; 0 to write them in chunks of 1 MB')
+    oparser.add_argument('--langs', dest="langs", default="",
+                         help='List of languages to include or ignore (%%): l1,l2,%%l3,%%l4')
+    oparser.add_argument('--langid', dest="langid", default="cld2", choices={'cld2', 'cld3', 'fasttext'},
+                         help="Model used for language detection: cld2, cld3 or fasttext")
+    oparser.add_argument('--langid-model', dest="langidModel", default=None,
+                         help="Path of the model used for language detection (only needed for fasttext)")
+    oparser.add_argument('--langid-sample', dest="langidSample", type=int, default=65536,
+                         help="Maximum number of characters of each document used for language detection; "
+                              "0 to use the whole document")
+    oparser.add_argument('--compression', dest='compression', default='gz', choices={'xz', 'gz'},
+                         help='Compression type for the output files')
+    oparser.add_argument('--compression-level', dest='compressionLevel', type=int, default=None,
+                         help='Compression level of the output files (by default, 9 for gz and 6 for xz)')
+    oparser.add_argument('--compression-threads', dest='compressionThreads', type=int, default=2,
+                         help='Number of threads that compress the output files in the background, in chunks of '
+                              '1 MB; 0 to compress them in the main thread')
+    oparser.add_argument('--workers', dest='workers', type=int, default=1,
+                         help='Number of processes used to preprocess the records; if more than one, records are '
+                              'read by the main process and written in the same order they were read')
+    oparser.add_argument('--batch-size', dest='batchSize', type=int, default=64,
+                         help='Number of records processed at once (e.g. by language identification)')
+    oparser.add_argument('--max-size', dest='maxSize', type=int, default=0,
+                         help='Records larger than this size in bytes are discarded without reading them; 0 for no '
+                              'limit')
+    options = oparser.parse_args()
+
+    logging.basicConfig(
+        format='%(asctime)s %(levelname)-8s %(message)s',
+        level=logging.INFO if options.verbose else logging.ERROR,
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+    with Warc2Preprocessor(boilerplate=options.boilerplate, parser=options.parser, html5lib=options.html5lib,
+                           langs=options.langs, l1=options.l1, l2=options.l2, langid=options.langid,
+                           langid_model=options.langidModel, langid_sample=options.langidSample,
+                           input_hash=options.inputHash, hash_index=options.hashIndex, xzlang=options.xzlang,
+                           compression=options.compression, workers=options.workers,
+                           batch_size=options.batchSize, max_size=options.maxSize,
+                           xzlang_flush=options.xzlangFlush, compression_level=options.compressionLevel,
+                           compression_threads=options.compressionThreads) as preprocessor:
+        input_name = "-" if options.input == sys.stdin else options.input
+        preprocessor.open_output(options.outDir, output_hash=options.outputHash, input_name=input_name)
+        preprocessor.process_stream(input_name, parse_byte_range(options.byteRange) if options.byteRange else None)
+        preprocessor.merge_hash_index()
+        preprocessor.report()
+
+
+if __name__ == "__main__":
+    main()
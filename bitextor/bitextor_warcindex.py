@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Standalone tool, not run by the workflow: it indexes a large WARC and prints byte ranges of its records, so that the
+# WARC can be preprocessed by hand as several parallel warc2htmlwarc | warc2preprocess jobs with --byte-range.
+
+import argparse
+import sys
+
+from bitextor.utils.warcindex import index_warc, write_index, read_index, split_ranges
+
+
+def main():
+    oparser = argparse.ArgumentParser(
+        description="Build the offset index of the records of a WARC (offset, length, record id, URL, content type "
+                    "and payload digest), or print balanced byte ranges of records from an existing index, which can "
+                    "be processed in parallel with the --byte-range option of warc2htmlwarc and warc2preprocess.")
+    oparser.add_argument('index', help='Index file (gzipped TSV)')
+    oparser.add_argument('-i', '--input', dest='input', default=None,
+                         help='WARC file to index (uncompressed or gzipped record by record); if not given, the index '
+                              'is read instead')
+    oparser.add_argument('--ranges', dest='ranges', type=int, default=0,
+                         help='Print this number of byte ranges START-END of a similar size, one per line')
+    oparser.add_argument('--duplicates', action='store_true', default=False,
+                         help='Print the record ids of the records whose payload digest was seen before in the index')
+    options = oparser.parse_args()
+
+    if options.input:
+        write_index(index_warc(open(options.input, 'rb')), options.index)
+
+    if options.ranges:
+        for start, end in split_ranges(read_index(options.index), options.ranges):
+            sys.stdout.write(f"{start}-{end}\n")
+
+    if options.duplicates:
+        seen = set()
+        for entry in read_index(options.index):
+            if entry.digest is None:
+                continue
+            if entry.digest in seen:
+                sys.stdout.write(f"{entry.record_id}\n")
+            seen.add(entry.digest)
+
+
+if __name__ == '__main__':
+    main()
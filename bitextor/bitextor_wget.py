@@ -16,6 +16,7 @@
 #  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
 
 import argparse
+import os
 import subprocess
 import sys
 import requests
@@ -92,7 +93,7 @@ def run(url, out_path, time_limit, agent, filetypes, warcfilename, wait):
                 print(e, file=sys.stderr)
                 pass
 
-    system_check("rm {WARC}".format(WARC=warcfilebasename + ".warc"))
+    os.remove(warcfilebasename + ".warc")
 
 
 if __name__ == "__main__":
@@ -61,7 +61,7 @@ def validate_args(config):
         'parallelWorkers': {
             'type': 'dict',
             'allowed': [
-                'split', 'translate', 'tokenise_src', 'tokenise_trg', 'docalign', 'segalign', 'sents'
+                'preprocess', 'split', 'translate', 'tokenise_src', 'tokenise_trg', 'docalign', 'segalign', 'sents'
             ],
             'valuesrules': {'type': 'integer', 'min': 1}
         },
@@ -71,6 +71,8 @@ def validate_args(config):
         'warcs': {'type': 'list', 'check_with': isfile},
         'warcsFile': {'type': 'string', 'check_with': isfile},
         # crawling
+        'crawler': {'type': 'string', 'allowed': ['wget', 'asyncio'], 'default': 'wget'},
+        'crawlConcurrency': {'type': 'integer', 'min': 1},
         'crawlTimeLimit': {'type': 'string'},
         'crawlerUserAgent': {'type': 'string'},
         'crawlWait': {'type': 'string'},
@@ -87,15 +89,18 @@ def validate_args(config):
         'ftfy': {'type': 'boolean', 'dependencies': {'preprocessor': 'warc2preprocess'}},
         'langID': {
             'type': 'string',
-            'allowed': ['cld2', 'cld3'],
+            'allowed': ['cld2', 'cld3', 'fasttext'],
             'dependencies': {'preprocessor': 'warc2preprocess'}
         },
+        'langIDModel': {'type': 'string', 'check_with': isfile, 'dependencies': {'langID': 'fasttext'}},
         'parser': {
             'type': 'string',
             'allowed': ['bs4', 'modest', 'simple', 'lxml'],
             'dependencies': {'preprocessor': 'warc2preprocess'}
         },
         'html5lib': {'type': 'boolean', 'dependencies': {'preprocessor': 'warc2preprocess'}},
+        'plainTextHashes': {'type': 'string', 'dependencies': {'preprocessor': 'warc2preprocess'}},
+        'maxRecordSize': {'type': 'integer', 'min': 0, 'default': 5242880},
         # pdfEXTRACT
         'PDFextract': {'type': 'boolean', 'dependencies': {'preprocessor': 'warc2preprocess'}},
         'PDFextract_configfile': {'type': 'string', 'dependencies': 'PDFextract'},
@@ -103,8 +108,10 @@ def validate_args(config):
         'PDFextract_kenlm_path': {'type': 'string', 'dependencies': 'PDFextract'},
         # boilerplate (prevertical2text, i.e. preverticals, and warc2preprocess)
         'boilerplateCleaning': {'type': 'boolean', 'default': False},
+        'boilerplateEngine': {'type': 'string', 'allowed': ['boilerpipe', 'density'], 'default': 'boilerpipe'},
         # tokenization
         'sentenceSplitters': {'type': 'dict'},
+        'persistentSentenceSplitters': {'type': 'boolean', 'default': False},
         'customNBPs': {'type': 'dict'},
         'wordTokenizers': {'type': 'dict'},
         'pruneThreshold': {'type': 'integer', 'min': 0, 'default': 0},
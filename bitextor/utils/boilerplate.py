@@ -0,0 +1,191 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Boilerplate removal of batches of HTML documents with pluggable backends: boilerpipe, run in a JVM that lives as long
+# as the process, or a pure Python (lxml) extractor based on the same rules. Both return the HTML of the content blocks
+# of each document and keep track of their throughput.
+
+import os
+import time
+import logging
+import importlib.machinery
+from collections import Counter
+
+
+class BoilerplateRemover(object):
+    """
+    Base class of the boilerplate removal backends. extract() receives an HTML document and returns the HTML of its
+    content, or raises an exception if the document cannot be processed
+    """
+    name = None
+
+    def __init__(self):
+        self.stats = Counter()
+
+    def extract(self, html):
+        raise NotImplementedError
+
+    def remove_boilerplate(self, texts):
+        """
+        Remove the boilerplate of every HTML document of the list. Documents that cannot be processed are None in the
+        returned list
+        """
+        start = time.perf_counter()
+        deboiled = []
+        for text in texts:
+            try:
+                deboiled.append(self.extract(text))
+            except Exception as ex:
+                logging.info(f"Boilerplate removal ({self.name}) failed: {ex}")
+                deboiled.append(None)
+        self.stats["seconds"] += time.perf_counter() - start
+        self.stats["documents"] += len(texts)
+        self.stats["chars"] += sum(len(text) for text in texts)
+        return deboiled
+
+    def pop_stats(self):
+        stats = self.stats
+        self.stats = Counter()
+        return stats
+
+
+def start_jvm():
+    """
+    Start the JVM with the jars distributed with boilerpipe in the classpath, unless it is already running
+    """
+    import jpype
+    if not jpype.isJVMStarted():
+        jars = []
+        for top, dirs, files in os.walk(
+            os.path.dirname(importlib.machinery.PathFinder().find_module("boilerpipe").get_filename()) + '/data'
+        ):
+            for nm in files:
+                if nm[-4:] == ".jar":
+                    jars.append(os.path.join(top, nm))
+        jpype.addClassPath(os.pathsep.join(jars))
+        jpype.startJVM(jpype.getDefaultJVMPath(), convertStrings=False)
+    return jpype
+
+
+class BoilerpipeRemover(BoilerplateRemover):
+    """
+    boilerpipe (ArticleExtractor by default). Unlike boilerpipe.extract.Extractor, which looks up the extractor and
+    builds a highlighter for every document and sends the document to the JVM twice, the Java objects are created once
+    and every document is converted to a Java string only once
+    """
+    name = "boilerpipe"
+
+    def __init__(self, extractor="ArticleExtractor"):
+        super().__init__()
+        self.jpype = start_jvm()
+        self.extractor = self.jpype.JClass("de.l3s.boilerpipe.extractors." + extractor).INSTANCE
+        self.highlighter = self.jpype.JClass("de.l3s.boilerpipe.sax.HTMLHighlighter").newExtractingInstance()
+        self.StringReader = self.jpype.JClass("java.io.StringReader")
+        self.InputSource = self.jpype.JClass("org.xml.sax.InputSource")
+        self.BoilerpipeSAXInput = self.jpype.JClass("de.l3s.boilerpipe.sax.BoilerpipeSAXInput")
+
+    def extract(self, html):
+        java_html = self.jpype.JString(html)
+        document = self.BoilerpipeSAXInput(self.InputSource(self.StringReader(java_html))).getTextDocument()
+        self.extractor.process(document)
+        return str(self.highlighter.process(document, java_html))
+
+
+class DensityRemover(BoilerplateRemover):
+    """
+    Pure Python boilerplate removal with lxml. Elements that never hold content are dropped, and the innermost block
+    elements are classified as content or boilerplate by their number of words and link density with the rules of
+    boilerpipe's NumWordsRulesClassifier (Kohlschütter et al., 2010). Boilerplate blocks are removed from the tree.
+    Much faster than boilerpipe and without a JVM, although its output is not the same
+    """
+    name = "density"
+
+    # forms, and their text fields, are kept: some sites (e.g. ASP.NET ones) wrap the whole page in a form, and their
+    # text blocks are classified like the rest
+    removed_tags = ("script", "style", "noscript", "template", "nav", "aside", "button", "iframe", "object", "embed",
+                    "svg")
+
+    block_tags = frozenset(["body", "article", "section", "main", "div", "p", "pre", "blockquote", "center",
+                            "address", "figure", "figcaption", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol",
+                            "li", "dl", "dt", "dd", "table", "caption", "tr", "td", "th", "header", "footer"])
+
+    def __init__(self):
+        super().__init__()
+        import lxml.html
+        from lxml import etree
+        self.lxml_html = lxml.html
+        self.etree = etree
+        self.parser = lxml.html.HTMLParser(encoding="utf-8", remove_comments=True, remove_pis=True)
+
+    def text_blocks(self, root):
+        """
+        Innermost block elements of the tree (the ones without block descendants) in document order, with their
+        number of words and link density; blocks without words are skipped
+        """
+        block_tags = self.block_tags
+        inner = []
+        outer = set()
+        for element in root.iter(*block_tags):
+            inner.append(element)
+            parent = element.getparent()
+            while parent is not None and parent.tag not in block_tags:
+                parent = parent.getparent()
+            if parent is not None:
+                outer.add(parent)
+
+        blocks = []
+        for element in inner:
+            if element in outer:
+                continue
+            words = len(element.text_content().split())
+            if words == 0:
+                continue
+            link_words = sum(len(link.text_content().split()) for link in element.iter("a"))
+            blocks.append((element, words, link_words / words))
+        return blocks
+
+    @staticmethod
+    def is_content(prev, curr, nxt):
+        prev_words, prev_link_density = prev
+        curr_words, curr_link_density = curr
+        next_words = nxt[0]
+
+        if curr_link_density > 0.333333:
+            return False
+        if prev_link_density <= 0.555556:
+            if curr_words <= 16 and next_words <= 15 and prev_words <= 4:
+                return False
+            return True
+        return curr_words > 40 or next_words > 17
+
+    def extract(self, html):
+        root = self.lxml_html.document_fromstring(html.encode("utf8"), parser=self.parser)
+        self.etree.strip_elements(root, *self.removed_tags, with_tail=False)
+
+        blocks = self.text_blocks(root)
+        features = [(0, 0.0)] + [(words, link_density) for element, words, link_density in blocks] + [(0, 0.0)]
+        boilerplate = [element for i, (element, words, link_density) in enumerate(blocks)
+                       if not self.is_content(features[i], features[i + 1], features[i + 2])]
+        for element in boilerplate:
+            element.drop_tree()
+
+        return self.lxml_html.tostring(root, encoding="unicode")
+
+
+def load_boilerplate_remover(name):
+    if name == "density":
+        return DensityRemover()
+    else:
+        return BoilerpipeRemover()
@@ -19,12 +19,25 @@ except ImportError:
     from backports import lzma
 
 import gzip
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
 from contextlib import contextmanager
 
 import subprocess
 import psutil
+import queue
+import shutil
 import sys
 import os
+import logging
+import threading
+
+# Line written after every document sent to a PersistentTextProcessor. The default one, a tag alone in a line, is copied
+# verbatim by sentence splitters (split-sentences.perl also ends the current paragraph with it), while word tokenisers
+# split tags, but keep a single word as it is
+DOCUMENT_DELIMITER = "<BITEXTOR-DOCUMENT-END>"
+WORD_DOCUMENT_DELIMITER = "BITEXTORDOCUMENTEND"
+
 
 class ExternalTextProcessor(object):
 
@@ -37,6 +50,151 @@ class ExternalTextProcessor(object):
 
         return outs.decode('utf-8'), errs.decode('utf-8'), proc.returncode
 
+    def process_batch(self, input_texts):
+        outputs = []
+        for input_text in input_texts:
+            output, error_output, returncode = self.process(input_text)
+            if returncode != 0:
+                return outputs, error_output, returncode
+            outputs.append(output)
+        return outputs, "", 0
+
+
+class PersistentTextProcessor(object):
+    """
+    External text processor run as a single long-lived process instead of a process per document. Every document is
+    written to its standard input followed by a line with the delimiter, and its output is read up to the line with the
+    delimiter, so the command must process its input line by line, copy the delimiter line to its output and flush its
+    output after every line (Python commands are run with PYTHONUNBUFFERED, and the rest with stdbuf, if available, for
+    the commands that buffer their output with the C library). If the process dies or does not write anything for
+    timeout seconds, it is started again and the document is retried. process() and process_batch() return the same as
+    the ones of ExternalTextProcessor, but errors are written directly to stderr
+    """
+
+    def __init__(self, cmd, delimiter=DOCUMENT_DELIMITER, timeout=60, retries=1, stdbuf=True):
+        self.cmd = cmd
+        self.delimiter = delimiter
+        self.timeout = timeout
+        self.retries = retries
+        self.stdbuf = stdbuf
+        self.proc = None
+        self.inputs = None
+        self.outputs = None
+
+    def start(self):
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        cmd = self.cmd
+        if self.stdbuf and shutil.which("stdbuf"):
+            # line buffered output for the commands that use the stdio buffering of the C library
+            cmd = ["stdbuf", "-oL"] + cmd
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+        # stdin and stdout are handled by their own threads, so that the process never blocks writing its output
+        # while a long document is being written
+        self.inputs = queue.Queue()
+        self.outputs = queue.Queue()
+        threading.Thread(target=self._write, args=(self.proc, self.inputs), daemon=True).start()
+        threading.Thread(target=self._read, args=(self.proc, self.outputs), daemon=True).start()
+
+    @staticmethod
+    def _write(proc, inputs):
+        try:
+            for data in iter(inputs.get, None):
+                proc.stdin.write(data)
+                proc.stdin.flush()
+            proc.stdin.close()
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def _read(proc, outputs):
+        for line in proc.stdout:
+            outputs.put(line)
+        outputs.put(None)
+
+    def stop(self):
+        if self.proc is None:
+            return
+        self.inputs.put(None)
+        self.proc.kill()
+        self.proc.wait()
+        self.proc = None
+
+    def frame(self, input_text):
+        # lines of the document that would be taken for the delimiter are replaced by empty lines, so that the number
+        # of lines of the document is kept
+        text = input_text.rstrip("\n")
+        lines = text.split("\n") if text else []
+        text = "".join(("" if line.strip() == self.delimiter else line) + "\n" for line in lines)
+        return (text + self.delimiter + "\n").encode("utf-8")
+
+    def roundtrip(self, data, ends, is_end):
+        """
+        Write data to the process and read its output until `ends` lines for which is_end is true have been read,
+        restarting the process if needed. Returns the lines read, or None, and the error
+        """
+        error = ""
+        for _ in range(self.retries + 1):
+            if self.proc is None:
+                self.start()
+            self.inputs.put(data)
+            output = []
+            found = 0
+            try:
+                while found < ends:
+                    line = self.outputs.get(timeout=self.timeout)
+                    if line is None:
+                        break
+                    output.append(line)
+                    found += is_end(line)
+            except queue.Empty:
+                error = f"{' '.join(self.cmd)}: no output for {self.timeout} seconds"
+            else:
+                if found == ends:
+                    return output, ""
+                error = f"{' '.join(self.cmd)}: exited with code {self.proc.wait()} before the end of its input"
+            sys.stderr.write(f"WARNING: {error}, restarting it\n")
+            self.stop()
+
+        return None, error
+
+    def process_batch(self, input_texts):
+        """
+        Process several documents in a single round trip. Returns the list of outputs, error output and return code
+        """
+        data = b"".join(self.frame(input_text) for input_text in input_texts)
+        delimiter = self.delimiter.encode("utf-8")
+
+        output, error = self.roundtrip(data, len(input_texts), lambda line: line.rstrip(b"\r\n") == delimiter)
+        if output is None:
+            return [], error, 1
+
+        outputs = []
+        document = []
+        for line in output:
+            if line.rstrip(b"\r\n") == delimiter:
+                outputs.append(b"".join(document).decode("utf-8"))
+                document = []
+            else:
+                document.append(line)
+        return outputs, "", 0
+
+    def process(self, input_text):
+        outputs, error_output, returncode = self.process_batch([input_text])
+        return outputs[0] if outputs else "", error_output, returncode
+
+    def process_lines(self, lines):
+        """
+        Process lines (with no line breaks) with a command that writes exactly a line for every line it reads, like
+        word tokenisers or Apertium, so no delimiter is needed. Returns the list of output lines, without line
+        breaks, error output and return code
+        """
+        data = "".join(line + "\n" for line in lines).encode("utf-8")
+
+        output, error = self.roundtrip(data, len(lines), lambda line: True)
+        if output is None:
+            return [], error, 1
+        return [line.rstrip(b"\r\n").decode("utf-8") for line in output], "", 0
+
 
 @contextmanager
 def open_xz_or_gzip_or_plain(file_path, mode='rt'):
@@ -231,3 +389,60 @@ def get_all_idxs_from_list(l, element):
             find_idx = len(l)
 
     return idxs
+
+
+def batched(iterable, size):
+    """Yield lists of up to size consecutive items of iterable."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bounded_imap(executor, func, iterable, window, ordered=True):
+    """Apply func to every item of iterable through executor and yield the results.
+
+    No more than window tasks are pending at any time, so a long input stream is
+    consumed as results are produced instead of being queued all at once. Results are
+    yielded in input order unless ordered is False.
+    """
+    pending = deque() if ordered else set()
+
+    for item in iterable:
+        future = executor.submit(func, item)
+        if ordered:
+            pending.append(future)
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        else:
+            pending.add(future)
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    if ordered:
+        while pending:
+            yield pending.popleft().result()
+    else:
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def log_throughput(stage, stats):
+    """
+    Log the throughput of a processing stage from its stats: a Counter with the number of seconds, documents and
+    characters processed (e.g. as returned by LanguageIdentifier.pop_stats, possibly added up)
+    """
+    seconds = max(stats["seconds"], 1e-9)
+    documents = stats["documents"]
+    chars = stats["chars"]
+    if documents:
+        logging.info(f"{stage}: {documents} documents, {chars} characters in {stats['seconds']:.2f}s "
+                     f"({documents / seconds:.1f} documents/s, {chars / seconds / 1e6:.2f} Mchars/s)")
@@ -0,0 +1,90 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Conversion of payloads to text. Most documents are UTF-8 (and all of them are after warc2htmlwarc), so a strict
+# UTF-8 decoding, which validates and decodes in a single pass, is tried first. Otherwise, the charset declared in the
+# HTTP headers or in a <meta> tag is used, and charset detection, which is slow, is only run on a prefix of the payload
+# as a last resort.
+
+import codecs
+import re
+
+import cchardet
+
+# Number of bytes of the payload used for charset detection
+DETECTION_SAMPLE = 65536
+
+# Number of bytes of the payload where <meta> charset declarations are looked for
+META_PRESCAN = 8192
+
+CHARSET_RE = re.compile(r"""charset\s*=\s*["']?\s*([a-zA-Z0-9_:.\-]+)""", flags=re.IGNORECASE)
+META_CHARSET_RE = re.compile(rb"""<meta[^>]*?charset\s*=\s*["']?\s*([a-zA-Z0-9_:.\-]+)""", flags=re.IGNORECASE)
+
+# Declared charsets that are decoded as a different one, like browsers do: ISO-8859-1 and US-ASCII are actually
+# windows-1252, and UTF-16 declarations in an ASCII-compatible document are wrong
+DECLARED_CHARSETS = {"iso8859-1": "windows-1252", "ascii": "windows-1252", "utf-16": None, "utf-16-le": None,
+                     "utf-16-be": None, "utf-32": None, "utf-32-le": None, "utf-32-be": None}
+
+
+def declared_charset(data, content_type=None):
+    """
+    Charset declared in a Content-Type HTTP header or, if there is none, in a <meta> tag at the beginning of the payload.
+    Returns None if there is none or it is not known by Python
+    """
+    match = CHARSET_RE.search(content_type) if content_type else None
+    if match:
+        charset = match.group(1)
+    else:
+        match = META_CHARSET_RE.search(data, 0, META_PRESCAN)
+        if not match:
+            return None
+        charset = match.group(1).decode("ascii")
+
+    try:
+        name = codecs.lookup(charset).name
+    except LookupError:
+        return None
+    return DECLARED_CHARSETS.get(name, charset)
+
+
+def convert_encoding(data, content_type=None):
+    """
+    Decode a payload. content_type is the value of its Content-Type HTTP header, if any.
+    Returns the original encoding and the text, or (None, '') if the payload is empty
+    """
+    if len(data) == 0:
+        return None, ''
+
+    try:
+        return "ASCII" if data.isascii() else "UTF-8", data.decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+
+    charset = declared_charset(data, content_type)
+    if charset:
+        try:
+            return charset.upper(), data.decode(charset)
+        except UnicodeDecodeError:
+            pass
+
+    encoding = cchardet.detect(data[:DETECTION_SAMPLE])['encoding']
+    # if detected encoding fails (or is None), fall back to ISO-8859-1, which never fails
+    for enc in [encoding, 'ISO-8859-1']:
+        if enc is None:
+            continue
+        try:
+            return enc, data.decode(enc)
+        except (LookupError, UnicodeDecodeError):
+            pass
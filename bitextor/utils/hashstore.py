@@ -0,0 +1,118 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Compact storage of MurmurHash values (unsigned 32 bits) used for deduplication. Hashes are kept in sorted numpy
+# arrays, which take 4 bytes per hash instead of the ~70 bytes of an int in a Python set. A hash index is a sorted
+# array saved as a .npy file: it is memory-mapped when loaded, so concurrent jobs share it read-only through the page
+# cache, and it is replaced atomically when new hashes are merged into it.
+
+import os
+import fcntl
+import tempfile
+
+import numpy as np
+
+from bitextor.utils.common import open_xz_or_gzip_or_plain
+
+HASH_DTYPE = np.uint32
+
+
+def load_hash_index(path):
+    """
+    Load a hash index. .npy files are memory-mapped; any other file is read as a (possibly compressed) text file
+    with one hash per line, like the ones written by warc2preprocess --output_hash
+    """
+    if path.endswith(".npy"):
+        if not os.path.isfile(path) or os.path.getsize(path) == 0:
+            return np.empty(0, dtype=HASH_DTYPE)
+        return np.load(path, mmap_mode='r')
+
+    with open_xz_or_gzip_or_plain(path) as reader:
+        hashes = np.fromiter((int(line) for line in reader if line.strip()), dtype=HASH_DTYPE)
+    return np.unique(hashes)
+
+
+def merge_hash_index(path, hashes):
+    """
+    Merge the given hashes into the .npy hash index in path, creating it if needed. Concurrent merges are serialised
+    with a lock file, and the index is written to a temporary file that replaces the old one, so jobs that already
+    mapped it keep reading a consistent copy
+    """
+    new_hashes = np.unique(np.asarray(hashes, dtype=HASH_DTYPE))
+
+    with open(path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        merged = np.union1d(load_hash_index(path), new_hashes).astype(HASH_DTYPE, copy=False)
+
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".",
+                                        dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                np.save(tmp, merged)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    return len(merged)
+
+
+def sorted_contains(array, value):
+    i = array.searchsorted(value)
+    return i < len(array) and array[i] == value
+
+
+class HashStore(object):
+    """
+    Set of hashes with bounded memory usage. New hashes go to a small Python set that, once it holds max_pending
+    hashes, is merged into a sorted numpy array. Read-only sorted arrays (e.g. memory-mapped hash indexes) can be
+    given as base and are looked up, but never copied. Hashes are stored with dtype (unsigned 32 bits by default)
+    """
+
+    def __init__(self, base=(), max_pending=1 << 18, dtype=HASH_DTYPE):
+        self.base = [array for array in base if len(array) > 0]
+        self.max_pending = max_pending
+        self.dtype = dtype
+        self.pending = set()
+        self.compacted = np.empty(0, dtype=dtype)
+
+    def add(self, value):
+        self.pending.add(value)
+        if len(self.pending) >= self.max_pending:
+            self.compact()
+
+    def compact(self):
+        if self.pending:
+            pending = np.fromiter(self.pending, dtype=self.dtype, count=len(self.pending))
+            self.compacted = np.union1d(self.compacted, pending).astype(self.dtype, copy=False)
+            self.pending = set()
+
+    def __contains__(self, value):
+        if value in self.pending:
+            return True
+        if sorted_contains(self.compacted, value):
+            return True
+        for array in self.base:
+            if sorted_contains(array, value):
+                return True
+        return False
+
+    def added(self):
+        """
+        Sorted array of the hashes added to the store (not including the base ones)
+        """
+        self.compact()
+        return self.compacted
@@ -0,0 +1,144 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Language identification of batches of documents with pluggable backends. Every backend detects the language on a
+# bounded sample of each document and keeps track of its throughput.
+
+import re
+import time
+from collections import Counter
+
+BODY_RE = re.compile(r"<body[\s>]", flags=re.IGNORECASE)
+
+
+def html_sample(text, max_chars=0):
+    """
+    Bounded sample of an HTML document (the whole document if max_chars is 0) without non-printable characters.
+    The sample starts at <body>, if present, so it is not filled with the contents of <head>
+    """
+    if max_chars and len(text) > max_chars:
+        body = BODY_RE.search(text)
+        if body:
+            text = text[body.start():]
+        text = text[:max_chars]
+
+    # only the distinct characters of the sample are checked, instead of every single character
+    unprintable = [c for c in set(text) if not c.isprintable()]
+    if unprintable:
+        text = text.translate(dict.fromkeys(map(ord, unprintable)))
+    return text
+
+
+class LanguageIdentifier(object):
+    """
+    Base class of the language identification backends. detect() receives a list of samples and returns a list with
+    the language code of each one ("un" if unknown). plain_text tells whether the backend has to be applied on the
+    extracted plain text (True) or can be applied on the HTML (False)
+    """
+    name = None
+    plain_text = True
+
+    def __init__(self, max_chars=0):
+        self.max_chars = max_chars
+        self.stats = Counter()
+
+    def sample(self, text):
+        if self.max_chars:
+            return text[:self.max_chars]
+        return text
+
+    def detect(self, samples):
+        raise NotImplementedError
+
+    def identify(self, texts):
+        """
+        Identify the language of every text of the list
+        """
+        start = time.perf_counter()
+        samples = [self.sample(text) for text in texts]
+        langs = self.detect(samples)
+        self.stats["seconds"] += time.perf_counter() - start
+        self.stats["documents"] += len(samples)
+        self.stats["chars"] += sum(len(sample) for sample in samples)
+        return langs
+
+    def pop_stats(self):
+        stats = self.stats
+        self.stats = Counter()
+        return stats
+
+
+class Cld2Identifier(LanguageIdentifier):
+    name = "cld2"
+    plain_text = False
+
+    def __init__(self, max_chars=0):
+        super().__init__(max_chars)
+        import pycld2
+        self.cld2 = pycld2
+
+    def sample(self, text):
+        return html_sample(text, self.max_chars)
+
+    def detect(self, samples):
+        langs = []
+        for sample in samples:
+            reliable, text_bytes, detected_languages = self.cld2.detect(sample, isPlainText=False)
+            langs.append(detected_languages[0][1])
+        return langs
+
+
+class Cld3Identifier(LanguageIdentifier):
+    name = "cld3"
+
+    def __init__(self, max_chars=0):
+        super().__init__(max_chars)
+        import cld3
+        self.model = cld3.LanguageIdentifier()
+
+    def detect(self, samples):
+        langs = []
+        for sample in samples:
+            language, probability, reliable, proportion = self.model.get_language(sample)
+            langs.append(language)
+        return langs
+
+
+class FastTextIdentifier(LanguageIdentifier):
+    """
+    fastText language identification models (e.g. lid.176.bin), which classify a whole batch in a single call
+    """
+    name = "fasttext"
+
+    def __init__(self, model_path, max_chars=0):
+        super().__init__(max_chars)
+        import fasttext
+        self.model = fasttext.load_model(model_path)
+
+    def detect(self, samples):
+        # fastText predicts on single lines
+        labels, probabilities = self.model.predict([sample.replace("\n", " ") for sample in samples])
+        return [label[0].replace("__label__", "") if label else "un" for label in labels]
+
+
+def load_language_identifier(name, max_chars=0, model_path=None):
+    if name == "cld3":
+        return Cld3Identifier(max_chars)
+    elif name == "fasttext":
+        if not model_path:
+            raise ValueError("A model is needed for fastText language identification")
+        return FastTextIdentifier(model_path, max_chars)
+    else:
+        return Cld2Identifier(max_chars)
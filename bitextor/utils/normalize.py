@@ -0,0 +1,78 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Normalization of extracted text and HTML with precompiled expressions, so every document goes through as few full
+# copies as possible.
+
+import re
+
+# Tabs, vertical tabs and form feeds; once replaced by spaces, runs of more than one space; and runs of newlines and
+# spaces that start with a newline (a space before a newline is removed beforehand). All of them start with a literal
+# character or a character class, so the regex engine skips quickly to the next candidate instead of trying a match
+# at every position
+OTHER_SPACE_RE = re.compile(r"[\t\v\f]")
+SPACE_RUN_RE = re.compile(r"  +")
+NEWLINE_RUN_RE = re.compile(r"\n[ \n]*")
+
+# Characters and numeric character references that are not valid in XML 1.0, which defines the valid character
+# range as:
+# Char ::= #x9 | #xA | #xD | [#x20-#xD7FF] | [#xE000-#xFFFD] | [#x10000-#x10FFFF]
+# C1 control characters are matched too, since HTML parsers map their references to windows-1252 characters.
+# Sources:
+# https://www.w3.org/TR/REC-xml/#charsets,
+# https://lsimons.wordpress.com/2011/03/17/stripping-illegal-characters-out-of-xml-in-python/
+ILLEGAL_XML_RE = re.compile(
+    r"[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]|&#(?:([0-9]+)|[xX]([0-9a-fA-F]+));?|([\x80-\x9f])")
+
+
+def normalize_plain_text(text):
+    """
+    Replace NBSP by spaces, remove CR, collapse runs of whitespace into a single newline (if they contain any) or a
+    single space, and strip the text. The result is the same as replacing NBSP, then removing CR, then replacing
+    [ \\t\\v\\f]+ by a space, " *\\n *" by a newline and \\n+ by a single newline, and stripping the text
+    """
+    # str.replace() is much faster than str.translate() on non-ASCII text
+    if "\xa0" in text:
+        text = text.replace("\xa0", " ")
+    if "\r" in text:
+        text = text.replace("\r", "")
+    text = OTHER_SPACE_RE.sub(" ", text)
+    text = SPACE_RUN_RE.sub(" ", text)
+    text = text.replace(" \n", "\n")
+    text = NEWLINE_RUN_RE.sub("\n", text)
+    return text.strip()
+
+
+def illegal_xml_replacement(match):
+    decimal, hexadecimal, c1 = match.groups()
+    if c1:
+        # keep the reference, so it is parsed as a windows-1252 character as it has always been
+        return f"&#{ord(c1)};"
+    if decimal is None and hexadecimal is None:
+        # invalid character
+        return ""
+    n = int(decimal, 10) if decimal is not None else int(hexadecimal, 16)
+    if n in (0xb, 0xc, 0xFFFE, 0xFFFF) or 0x0 <= n <= 0x8 or 0xe <= n <= 0x1F or 0xD800 <= n <= 0xDFFF:
+        return ""
+    return match.group(0)
+
+
+def strip_illegal_xml(html):
+    """
+    Strip invalid XML characters, and references to them, that `lxml` cannot parse. Done in a single pass over the
+    text: only the matches (which are rare) go through Python code
+    """
+    # See: https://github.com/html5lib/html5lib-python/issues/96
+    return ILLEGAL_XML_RE.sub(illegal_xml_replacement, html)
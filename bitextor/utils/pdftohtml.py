@@ -0,0 +1,91 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Conversion of PDFs to HTML with pdftohtml. pdftohtml converts a single document per run, so the conversions are run
+# by a bounded number of concurrent processes: the caller keeps reading and processing other records while they run
+# instead of waiting for every PDF. Every conversion is limited in input size and in time, so a pathological PDF
+# cannot stall the stream.
+
+import logging
+import subprocess
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+PDFTOHTML_COMMAND = ["pdftohtml", "-i", "-stdout", "-", "-"]
+
+
+class PdfToHtmlPool(object):
+    """
+    Pool of up to `processes` (at least one) concurrent pdftohtml processes. PDFs larger than max_size bytes (0 for no
+    limit) are not converted, and conversions running for more than timeout seconds (0 for no limit) are killed
+    """
+
+    def __init__(self, processes=2, timeout=60, max_size=0, command=PDFTOHTML_COMMAND):
+        self.processes = max(1, processes)
+        self.timeout = timeout if timeout > 0 else None
+        self.max_size = max_size
+        self.command = command
+        # pdftohtml does the work, so threads that wait for it are enough
+        self.executor = ThreadPoolExecutor(max_workers=self.processes)
+        self.stats = Counter()
+        self.latencies = []
+
+    def convert(self, data, url=""):
+        """
+        Convert a PDF. Returns the list of HTML payloads extracted from it, which is empty if it was not converted
+        """
+        if self.max_size and len(data) > self.max_size:
+            logging.info(f"Skipping PDF {url}: {len(data)} bytes, over the limit of {self.max_size}")
+            self.stats["oversized"] += 1
+            return []
+
+        start = time.perf_counter()
+        try:
+            result = subprocess.run(self.command, input=data, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                    timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            logging.info(f"Skipping PDF {url}: conversion timed out after {self.timeout}s")
+            self.stats["timeouts"] += 1
+            return []
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+        if result.returncode != 0:
+            self.stats["errors"] += 1
+        self.stats["converted"] += 1
+        return [result.stdout.replace(b"&#160;", b" ")]
+
+    def submit(self, data, url=""):
+        """
+        Start the conversion of a PDF in the background. Returns a future of the result of convert
+        """
+        return self.executor.submit(self.convert, data, url)
+
+    def report(self):
+        """
+        Log the number of converted PDFs and the distribution of their conversion times
+        """
+        logging.info(f"pdftohtml: {self.stats['converted']} PDFs converted ({self.stats['errors']} with errors), "
+                     f"{self.stats['timeouts']} timed out, {self.stats['oversized']} over the size limit")
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            total = sum(latencies)
+            logging.info(f"pdftohtml: {total:.2f}s in total, mean {total / len(latencies):.3f}s, "
+                         f"median {latencies[len(latencies) // 2]:.3f}s, "
+                         f"p95 {latencies[int(len(latencies) * 0.95)]:.3f}s, max {latencies[-1]:.3f}s")
+
+    def shutdown(self):
+        self.executor.shutdown()
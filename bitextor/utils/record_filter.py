@@ -0,0 +1,132 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Cheap filters applied to the records of a WARC before any expensive processing (decoding, parsing, language
+# identification...), with counters of the rejected records and the time spent by each filter. The filters of the
+# records that never contain text are shared by warc2htmlwarc and warc2preprocess: every header they need is looked up
+# once per record, and the rules are precompiled sets and regular expressions.
+
+import re
+import time
+import logging
+from collections import Counter
+
+# Types of the records that never contain text: any type under UNWANTED_MIME_PREFIXES and UNWANTED_MIME_TYPES
+UNWANTED_MIME_PREFIXES = frozenset(["image", "audio", "video"])
+UNWANTED_MIME_TYPES = frozenset(["text/x-component", "text/x-js", "text/javascript", "application/x-javascript",
+                                 "text/css", "application/javascript", "application/x-shockwave-flash",
+                                 "application/octet-stream", "application/x-font-ttf"])
+
+# URLs of the records that never contain text, including robots.txt
+UNWANTED_URL_RE = re.compile(r"(?:\.(?:gif|jpe?g|png|css|js|mp3|mp4|ogg|midi|swf)|/robots\.txt)$")
+
+DEFAULT_MAX_SIZE = 5242880
+
+
+class FilterChain(object):
+    """
+    Chain of named filters. Every filter is a function that receives the state of a record (a dict with the record
+    that filters can fill in, e.g. with its URL or its payload, for the next ones) and returns whether the record
+    passes. The chain stops at the first filter that rejects the record
+    """
+
+    def __init__(self, filters=()):
+        self.filters = list(filters)
+        self.records = 0
+        self.rejected = Counter()
+        self.seconds = Counter()
+
+    def add(self, name, function):
+        self.filters.append((name, function))
+
+    def __call__(self, state):
+        """
+        Run the filters on the state of a record. Returns whether the record passed all of them
+        """
+        self.records += 1
+        for name, function in self.filters:
+            start = time.perf_counter()
+            passed = function(state)
+            self.seconds[name] += time.perf_counter() - start
+            if not passed:
+                self.rejected[name] += 1
+                return False
+        return True
+
+    def report(self):
+        """
+        Log the number of records rejected by every filter and the time spent in it
+        """
+        for name, function in self.filters:
+            logging.info(f"Filter '{name}': {self.rejected[name]} of {self.records} records rejected "
+                         f"in {self.seconds[name]:.2f}s")
+
+
+def filter_record_type(state):
+    return state["record"].rec_type in ('response', 'resource')
+
+
+def filter_url(state):
+    url = state["record"].rec_headers.get_header('WARC-Target-URI')
+    if not url:
+        return False
+    if url[0] == '<' and url[-1] == '>':
+        url = url[1:-1]
+    if url == "unknown":
+        logging.info("Skipping page with unknown URL")
+        return False
+    url = url.lower()
+    url = url.replace('\t', ' ')
+    state["url"] = url
+    return UNWANTED_URL_RE.search(url) is None
+
+
+def filter_warc_content_type(state):
+    warc_content_type = state["record"].rec_headers.get_header('Content-Type')
+    return warc_content_type is not None and "text/dns" not in warc_content_type
+
+
+def filter_content_type(state):
+    record = state["record"]
+    content_type = record.http_headers.get_header('Content-Type') if record.http_headers else None
+    state["content_type"] = content_type
+    if content_type is None:
+        return True
+    mime = content_type.partition(";")[0].strip().lower()
+    return mime not in UNWANTED_MIME_TYPES and mime.partition("/")[0] not in UNWANTED_MIME_PREFIXES
+
+
+def size_filter(max_size):
+    """
+    Filter of the records whose Content-Length is over max_size bytes (0 for no limit)
+    """
+    def filter_size(state):
+        if not max_size:
+            return True
+        size = int(state["record"].rec_headers.get_header('Content-Length') or 0)
+        if size > max_size:
+            logging.info("Skipping page, over limit. " + str(size) + " " + state["url"])
+            return False
+        return True
+
+    return filter_size
+
+
+def record_filters(max_size=DEFAULT_MAX_SIZE):
+    """
+    Filters of the records that never contain text, to be run in this order (the size filter uses the URL)
+    """
+    return [("record type", filter_record_type), ("URL", filter_url), ("WARC content type", filter_warc_content_type),
+            ("content type", filter_content_type), ("size", size_filter(max_size))]
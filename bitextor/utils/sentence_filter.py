@@ -0,0 +1,85 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Filters of the sentences of the split documents: sentences longer than the pruning threshold (in words or
+# characters) and trash sentences, which contain null characters or in which at least half of the characters are
+# punctuation or digits. All the rules are applied in a single pass over the sentences of a document, and no Python code
+# runs per character: punctuation and digits, which are ASCII, are counted by deleting them from the UTF-8 encoding of
+# the sentence with bytes.translate (the bytes of non-ASCII characters are never ASCII), which is much faster than
+# str.translate, and words are only counted, with a bounded split, for sentences that can be over the threshold.
+
+import logging
+import string
+from collections import Counter
+
+PUNCTUATION_AND_DIGITS = (string.punctuation + string.digits).encode("ascii")
+
+# Names of the rules, in the order in which they are applied
+RULES = ("too long", "null character", "punctuation and digits")
+
+
+def count_punctuation_and_digits(sentence):
+    encoded = sentence.encode("utf-8", errors="surrogatepass")
+    return len(encoded) - len(encoded.translate(None, PUNCTUATION_AND_DIGITS))
+
+
+class SentenceFilter(object):
+    """
+    Pruning and trash filter of sentences, with a counter of the sentences dropped by every rule
+    """
+
+    def __init__(self, prune_type="words", prune_threshold=0):
+        self.prune_type = prune_type
+        self.prune_threshold = prune_threshold
+        self.stats = Counter()
+
+    def too_long(self, sentence):
+        threshold = self.prune_threshold
+        if self.prune_type == "chars":
+            return len(sentence) > threshold
+        # a sentence of n characters has at most (n + 1) // 2 words, and the split stops after threshold + 1 words
+        return (len(sentence) + 1) // 2 > threshold and len(sentence.split(maxsplit=threshold)) > threshold
+
+    def __call__(self, sentences):
+        """
+        Returns the list of the sentences that are kept
+        """
+        kept = []
+        stats = self.stats
+        prune = self.prune_threshold > 0
+        for sentence in sentences:
+            if prune and self.too_long(sentence):
+                stats["too long"] += 1
+            elif "\x00" in sentence:
+                stats["null character"] += 1
+            elif count_punctuation_and_digits(sentence) >= len(sentence) // 2:
+                stats["punctuation and digits"] += 1
+            else:
+                kept.append(sentence)
+        stats["sentences"] += len(sentences)
+        return kept
+
+    def pop_stats(self):
+        stats = self.stats
+        self.stats = Counter()
+        return stats
+
+
+def report(stats):
+    """
+    Log the number of sentences dropped by every rule from the stats of SentenceFilter (possibly added up)
+    """
+    dropped = ", ".join(f"{stats[rule]} {rule}" for rule in RULES)
+    logging.info(f"Sentence filter: {stats['sentences']} sentences, dropped: {dropped}")
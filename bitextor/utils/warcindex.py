@@ -0,0 +1,138 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Offset index of the records of a WARC, like a CDX file: it is built once per WARC, in a single pass, and allows
+# reading any record, or any byte range of records, without reading the WARC from the beginning. The index is a gzipped
+# TSV file with a line per record: offset, length, record id, URL, content type and payload digest, with '-' for the
+# missing fields. Offsets are positions in the WARC file, so random access requires a WARC that is either uncompressed
+# or gzipped record by record, as WARCs are.
+
+import base64
+import gzip
+import hashlib
+from collections import namedtuple
+
+from warcio.archiveiterator import ArchiveIterator
+
+IndexEntry = namedtuple("IndexEntry", ["offset", "length", "record_id", "url", "content_type", "digest"])
+
+DIGEST_CHUNK_SIZE = 1 << 16
+
+
+def payload_digest(record):
+    """
+    SHA-1 digest of the payload of a record, in the format of WARC-Payload-Digest headers
+    """
+    sha1 = hashlib.sha1()
+    stream = record.content_stream()
+    chunk = stream.read(DIGEST_CHUNK_SIZE)
+    while chunk:
+        sha1.update(chunk)
+        chunk = stream.read(DIGEST_CHUNK_SIZE)
+    return "sha1:" + base64.b32encode(sha1.digest()).decode("ascii")
+
+
+def index_warc(stream):
+    """
+    Yield the IndexEntry of every record of a WARC. Payload digests are taken from the WARC-Payload-Digest headers,
+    and computed for the response and resource records that have none
+    """
+    iterator = ArchiveIterator(stream)
+    for record in iterator:
+        headers = record.rec_headers
+        digest = headers.get_header('WARC-Payload-Digest')
+        if digest is None and record.rec_type in ('response', 'resource'):
+            digest = payload_digest(record)
+        content_type = record.http_headers.get_header('Content-Type') if record.http_headers else None
+        if content_type is None:
+            content_type = record.content_type
+        iterator.read_to_end(record)
+        yield IndexEntry(iterator.get_record_offset(), iterator.get_record_length(), headers.get_header('WARC-Record-ID'),
+                         headers.get_header('WARC-Target-URI'), content_type, digest)
+
+
+def write_index(entries, path):
+    with gzip.open(path, "wt") as index:
+        for entry in entries:
+            fields = ["-" if field is None else str(field).replace("\t", " ").replace("\n", " ") for field in entry]
+            index.write("\t".join(fields) + "\n")
+
+
+def read_index(path):
+    """
+    Yield the IndexEntry of every record of an index written by write_index
+    """
+    with gzip.open(path, "rt") as index:
+        for line in index:
+            fields = [None if field == "-" else field for field in line.rstrip("\n").split("\t")]
+            yield IndexEntry(int(fields[0]), int(fields[1]), *fields[2:])
+
+
+def read_record_at(warc, offset):
+    """
+    Read the record of a WARC file at an offset of its index. Returns the record, whose payload must be read while the
+    file is open, and the file
+    """
+    f = open(warc, "rb")
+    f.seek(offset)
+    return next(ArchiveIterator(f)), f
+
+
+def iter_range(warc, start, end=None):
+    """
+    Yield the records of a WARC file that start between the offsets start (which must be the offset of a record) and
+    end (or the end of the file)
+    """
+    with open(warc, "rb") as f:
+        f.seek(start)
+        iterator = ArchiveIterator(f)
+        position = start
+        for record in iterator:
+            if end is not None and position >= end:
+                break
+            yield record
+            # the offsets of the iterator are positions in the file, since it is seekable, but they are only known once
+            # the record has been read
+            position = iterator.get_record_offset() + iterator.get_record_length()
+
+
+def split_ranges(entries, parts):
+    """
+    Split the records of an index in up to `parts` consecutive byte ranges of a similar size. Returns a list of
+    (start, end) offsets
+    """
+    entries = list(entries)
+    if not entries:
+        return []
+    first = entries[0].offset
+    last = entries[-1].offset + entries[-1].length
+    target = (last - first) / parts
+
+    ranges = []
+    start = first
+    for entry in entries[1:]:
+        if entry.offset - first >= target * (len(ranges) + 1) and len(ranges) < parts - 1:
+            ranges.append((start, entry.offset))
+            start = entry.offset
+    ranges.append((start, last))
+    return ranges
+
+
+def parse_byte_range(byte_range):
+    """
+    Parse a 'START-END' byte range, where END can be empty for the end of the file
+    """
+    start, _, end = byte_range.partition("-")
+    return int(start), int(end) if end else None
@@ -0,0 +1,148 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Splitting of .warc.gz files without decompressing and compressing them again. WARCs are gzipped record by record, so
+# every record is a gzip member, and a WARC can be cut at any member boundary: the pieces are byte ranges of the
+# original file, copied by the kernel. Member boundaries are found by looking for the gzip signature and checking that
+# the first bytes of the member decompress to the beginning of a WARC record, so only a few bytes are decompressed for
+# every boundary. A WARC compressed as a single gzip member cannot be split. It is used by tests/split-warc.py, a
+# standalone tool: the workflow does not split WARCs.
+
+import mmap
+import os
+import zlib
+
+GZIP_MAGIC = b"\x1f\x8b\x08"
+
+# Bytes of a candidate member that are decompressed to check it
+CHECK_SIZE = 1024
+
+COPY_CHUNK_SIZE = 1 << 30
+
+
+def is_member_start(data, position):
+    """
+    Whether a gzip member that contains the beginning of a WARC record starts at a position of data
+    """
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    try:
+        return decompressor.decompress(data[position:position + CHECK_SIZE], 5) == b"WARC/"
+    except zlib.error:
+        return False
+
+
+def next_member_start(data, position, end=None):
+    """
+    Offset of the first member that starts at or after position in data (e.g. a memory-mapped .warc.gz file), or end
+    (the end of data, by default) if there is none
+    """
+    end = len(data) if end is None else end
+    position = data.find(GZIP_MAGIC, position, end)
+    while position != -1 and not is_member_start(data, position):
+        position = data.find(GZIP_MAGIC, position + 1, end)
+    return end if position == -1 else position
+
+
+def member_starts(data):
+    """
+    Yield the offsets of all the members of data
+    """
+    position = next_member_start(data, 0)
+    while position < len(data):
+        yield position
+        position = next_member_start(data, position + 1)
+
+
+def balanced_cuts(data, parts):
+    """
+    Offsets where data has to be cut to get up to `parts` pieces of a similar size. Returns the list of (start, end)
+    offsets of the pieces
+    """
+    size = len(data)
+    cuts = [0]
+    for part in range(1, parts):
+        cut = next_member_start(data, max(size * part // parts, cuts[-1] + 1))
+        if cut >= size:
+            break
+        if cut > cuts[-1]:
+            cuts.append(cut)
+    cuts.append(size)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def record_cuts(data, records):
+    """
+    Offsets where data has to be cut to get pieces of `records` members. Returns the list of (start, end) offsets of
+    the pieces
+    """
+    cuts = [start for i, start in enumerate(member_starts(data)) if i % records == 0]
+    if not cuts:
+        return []
+    cuts[0] = 0
+    cuts.append(len(data))
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def copy_range(source, destination, start, end):
+    """
+    Copy the bytes between the offsets start and end of the source file descriptor to the destination one, inside the
+    kernel if possible
+    """
+    offset = start
+    try:
+        while offset < end:
+            copied = os.copy_file_range(source, destination, min(end - offset, COPY_CHUNK_SIZE), offset)
+            if copied == 0:
+                break
+            offset += copied
+        return
+    except (AttributeError, OSError):
+        pass
+
+    try:
+        while offset < end:
+            copied = os.sendfile(destination, source, offset, min(end - offset, COPY_CHUNK_SIZE))
+            if copied == 0:
+                break
+            offset += copied
+        return
+    except (AttributeError, OSError):
+        pass
+
+    while offset < end:
+        chunk = os.pread(source, min(end - offset, 1 << 20), offset)
+        if not chunk:
+            break
+        os.write(destination, chunk)
+        offset += len(chunk)
+
+
+def split_file(path, ranges, output_paths):
+    """
+    Write every (start, end) byte range of the file in path to the file with the same position in output_paths
+    """
+    with open(path, "rb") as source:
+        for (start, end), output_path in zip(ranges, output_paths):
+            with open(output_path, "wb") as destination:
+                copy_range(source.fileno(), destination.fileno(), start, end)
+
+
+def map_file(f):
+    """
+    Memory-map a file for reading; empty files, which cannot be mapped, are mapped to b''
+    """
+    if os.fstat(f.fileno()).st_size == 0:
+        return b""
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
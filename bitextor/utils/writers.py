@@ -0,0 +1,133 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Compressed output files whose compression runs in background threads, like pigz does. Writes are buffered in chunks,
+# and every chunk is compressed on its own as a gzip member or an xz stream: a sequence of them is still a valid
+# gzip or xz file. zlib and lzma release the GIL while compressing, so the chunks of all the files are compressed in
+# parallel with each other and with the thread that writes to them.
+
+import gzip
+import lzma
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_LEVELS = {"gz": 9, "xz": 6}
+
+CHUNK_SIZE = 1 << 20
+
+
+def compress_gzip(data, level):
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_xz(data, level):
+    return lzma.compress(data, format=lzma.FORMAT_XZ, preset=level)
+
+
+COMPRESSORS = {"gz": compress_gzip, "xz": compress_xz}
+
+
+class CompressionPool(object):
+    """
+    Threads shared by the compressed files opened through it. With 0 threads, chunks are compressed by the thread that
+    writes them
+    """
+
+    def __init__(self, threads=2, chunk_size=CHUNK_SIZE):
+        self.threads = threads
+        self.chunk_size = chunk_size
+        self.executor = ThreadPoolExecutor(max_workers=threads) if threads > 0 else None
+
+    def open(self, path, mode="wb", compression=None, level=None):
+        """
+        Open a file for writing. compression is 'gz' or 'xz'; if not given, it is taken from the extension of path,
+        and files with any other extension are not compressed
+        """
+        if compression is None:
+            compression = path[-2:] if path[-3:] in (".gz", ".xz") else None
+        if compression is None:
+            return open(path, mode)
+        return ParallelCompressedWriter(path, compression, level=level, mode=mode, pool=self)
+
+    def shutdown(self):
+        if self.executor:
+            self.executor.shutdown()
+            self.executor = None
+
+
+class ParallelCompressedWriter(object):
+    """
+    Binary file compressed in chunks of pool.chunk_size bytes. Compressed chunks are written in order, and no more
+    than twice the number of threads of the pool are kept in memory for every file
+    """
+
+    def __init__(self, path, compression, level=None, mode="wb", pool=None):
+        self.file = open(path, mode)
+        self.compress = COMPRESSORS[compression]
+        self.level = DEFAULT_LEVELS[compression] if level is None else level
+        self.pool = pool if pool is not None else CompressionPool(threads=0)
+        self.max_pending = max(1, self.pool.threads * 2)
+        self.buffer = []
+        self.buffered = 0
+        self.pending = deque()
+        self.empty = True
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.pool.chunk_size:
+            self.submit()
+        return len(data)
+
+    def submit(self):
+        if not self.buffered:
+            return
+        chunk = b"".join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+        self.empty = False
+
+        if self.pool.executor is None:
+            self.file.write(self.compress(chunk, self.level))
+            return
+
+        self.pending.append(self.pool.executor.submit(self.compress, chunk, self.level))
+        # write the chunks that are ready, and wait for the oldest one if there are too many
+        while self.pending and (self.pending[0].done() or len(self.pending) > self.max_pending):
+            self.file.write(self.pending.popleft().result())
+
+    def flush(self):
+        """
+        Compress and write everything written so far
+        """
+        self.submit()
+        while self.pending:
+            self.file.write(self.pending.popleft().result())
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.empty and not self.buffered:
+            # an empty file is not valid gzip or xz
+            self.file.write(self.compress(b"", self.level))
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
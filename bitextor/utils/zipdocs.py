@@ -0,0 +1,75 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Extraction of the XML members that contain the text of zip-based document formats (OpenDocument, Office Open XML
+# and EPUB). Members are selected by name from the central directory, so the rest of them are never decompressed, and
+# they are yielded one at a time, so only one of them is in memory. The decompressed size of every member and of the
+# whole document is limited against zip bombs: the sizes declared in the central directory are checked before
+# decompressing anything, and members are read with a limit, since the declared sizes can be wrong.
+
+import io
+import logging
+import re
+import zipfile
+
+# Members of every format that contain its text
+FORMAT_MEMBERS = {
+    # OpenDocument: content.xml
+    "odf": re.compile(r"content\.xml"),
+    # Office Open XML: word/document.xml, ppt/slides/slide*.xml, xl/sharedStrings.xml
+    "office": re.compile(r"word/document\.xml|ppt/slides/slide.*|xl/sharedStrings\.xml"),
+    # EPUB: *html, *xml
+    "epub": re.compile(r".*ml"),
+}
+
+MAX_MEMBER_SIZE = 64 * 1024 * 1024
+MAX_DOCUMENT_SIZE = 256 * 1024 * 1024
+
+
+def extract_members(data, doc_format, max_member_size=MAX_MEMBER_SIZE, max_document_size=MAX_DOCUMENT_SIZE,
+                    url=""):
+    """
+    Yield the decompressed text-bearing members of a document in a zip-based format ('odf', 'office' or 'epub'), in
+    the order of the zip. Members larger than max_member_size bytes are skipped, and no more members are extracted
+    once max_document_size bytes have been extracted. Nothing is yielded if data is not a valid zip file
+    """
+    selected = FORMAT_MEMBERS[doc_format]
+    try:
+        document = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        return
+
+    with document:
+        remaining = max_document_size
+        for info in document.infolist():
+            if not selected.fullmatch(info.filename):
+                continue
+            limit = min(max_member_size, remaining)
+            if info.file_size > limit:
+                logging.info(f"Skipping member {info.filename} of {url}: {info.file_size} bytes declared, "
+                             f"{limit} allowed")
+                continue
+
+            try:
+                with document.open(info) as member:
+                    xml = member.read(limit + 1)
+            except Exception:
+                continue
+            if len(xml) > limit:
+                logging.info(f"Skipping member {info.filename} of {url}: over {limit} bytes once decompressed")
+                continue
+
+            remaining -= len(xml)
+            yield xml
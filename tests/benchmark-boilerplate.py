@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Throughput of the boilerplate removal backends of warc2preprocess on the HTML documents of a WARC
+
+import argparse
+import time
+
+from bitextor.bitextor_warc2preprocess import Warc2Preprocessor, open_archive
+from bitextor.utils.boilerplate import load_boilerplate_remover
+from bitextor.utils.encoding import convert_encoding
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the boilerplate removal backends of warc2preprocess")
+    parser.add_argument("warc", help="WARC file (e.g. the output of warc2htmlwarc)")
+    parser.add_argument("--engines", default="boilerpipe,density",
+                        help="Comma-separated list of backends to compare")
+    parser.add_argument("--limit", type=int, default=0, help="Maximum number of documents (0 for all of them)")
+    options = parser.parse_args()
+
+    preprocessor = Warc2Preprocessor()
+    documents = []
+    for record in open_archive(options.warc):
+        document = preprocessor.read_document(record)
+        if document is None:
+            continue
+        encoding, text = convert_encoding(document[1], document[4])
+        if text.strip():
+            documents.append(text)
+        if options.limit and len(documents) >= options.limit:
+            break
+    chars = sum(len(document) for document in documents)
+    print(f"{len(documents)} documents, {chars / 1e6:.1f} Mchars")
+
+    for name in options.engines.split(","):
+        start = time.perf_counter()
+        remover = load_boilerplate_remover(name)
+        startup = time.perf_counter() - start
+
+        deboiled = remover.remove_boilerplate(documents)
+        stats = remover.pop_stats()
+        seconds = max(stats["seconds"], 1e-9)
+        kept = sum(len(html) for html in deboiled if html is not None)
+        failed = sum(1 for html in deboiled if html is None)
+        print(f"{name:>10}: startup {startup:.2f}s, {seconds:.2f}s ({len(documents) / seconds:.1f} documents/s, "
+              f"{chars / seconds / 1e6:.2f} Mchars/s), output {kept / max(chars, 1):.1%} of the input, "
+              f"{failed} failed")
+
+
+if __name__ == '__main__':
+    main()
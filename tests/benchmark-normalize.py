@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Microbenchmark of the plain text normalization of warc2preprocess: the previous chain of regular expressions against
+# normalize_plain_text. Documents are read from plain_text.gz files (one base64 document per line) or generated.
+
+import argparse
+import random
+import re
+import sys
+
+from benchmark_common import WORDS, read_documents, bench
+from bitextor.utils.normalize import normalize_plain_text
+
+
+def normalize_chain(text):
+    return re.sub(r"\n+", "\n",
+                  re.sub(r" *\n *", "\n",
+                         re.sub(r"[ \t\v\f]+", " ",
+                                re.sub(r"\r", "",
+                                       text.replace(u'\xa0', u' '))))).strip()
+
+
+def generate_documents(n, size, seed):
+    rng = random.Random(seed)
+    separators = [" "] * 50 + ["\n"] * 5 + ["  ", "\t", "\xa0", " \n", "\n\n    ", "\r\n", " \t \n \n", "\f"]
+    for _ in range(n):
+        parts = []
+        length = 0
+        while length < size:
+            word = rng.choice(WORDS)
+            separator = rng.choice(separators)
+            parts.append(word)
+            parts.append(separator)
+            length += len(word) + len(separator)
+        yield "".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the plain text normalization of warc2preprocess")
+    parser.add_argument("plain_text", nargs="*", help="plain_text.gz files written by warc2preprocess")
+    parser.add_argument("--documents", type=int, default=2000, help="Number of generated documents")
+    parser.add_argument("--size", type=int, default=20000, help="Size in characters of the generated documents")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5, help="Best time of this number of runs is reported")
+    options = parser.parse_args()
+
+    if options.plain_text:
+        documents = list(read_documents(options.plain_text))
+    else:
+        documents = list(generate_documents(options.documents, options.size, options.seed))
+    chars = sum(len(document) for document in documents)
+
+    for document in documents:
+        if normalize_chain(document) != normalize_plain_text(document):
+            sys.stderr.write("Outputs differ for document: {}\n".format(repr(document[:200])))
+            sys.exit(1)
+
+    print(f"{len(documents)} documents, {chars / 1e6:.1f} Mchars, outputs are identical")
+    for name, function in (("regex chain", normalize_chain), ("normalize_plain_text", normalize_plain_text)):
+        seconds = bench(function, documents, options.repeat)
+        print(f"{name:>22}: {seconds:.3f}s ({chars / seconds / 1e6:.1f} Mchars/s)")
+
+
+if __name__ == '__main__':
+    main()
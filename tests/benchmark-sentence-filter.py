@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Microbenchmark of the pruning and trash filter of bitextor_split.py: the previous per-character filter_trash and
+# list comprehensions against SentenceFilter. Sentences are read from sentences.gz files (one base64 document of
+# sentences per line, as written by bitextor_split.py) or generated.
+
+import argparse
+import random
+import string
+import sys
+
+from benchmark_common import WORDS, read_documents, bench
+from bitextor.utils.sentence_filter import SentenceFilter, RULES
+
+
+def filter_trash(sentence):
+    digits_and_punctuation = string.punctuation + string.digits
+    n = 0
+    for c in sentence:
+        if c == "\x00":
+            return False
+        if c in digits_and_punctuation:
+            n = n + 1
+    return n < len(sentence) // 2
+
+
+def filter_previous(segments, prune_type, prune_threshold):
+    if prune_threshold and prune_type == "words":
+        segments = [s for s in segments if not len(s.split()) > prune_threshold]
+    elif prune_threshold and prune_type == "chars":
+        segments = [s for s in segments if not len(s) > prune_threshold]
+
+    return [s for s in segments if filter_trash(s)]
+
+
+def generate_documents(n, sentences, seed):
+    rng = random.Random(seed)
+    words = WORDS + ["日本語", "2021", "3.14", "(c)", "--", "|", "€"]
+    for _ in range(n):
+        document = []
+        for _ in range(rng.randint(1, sentences)):
+            # mostly sentences of text, some menus, prices, dates... and a few very long ones
+            length = rng.choice([3, 8, 15, 25, 40, 200])
+            document.append(" ".join(rng.choice(WORDS if rng.random() < 0.8 else words) for _ in range(length)))
+        yield document
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the sentence filter of bitextor_split.py")
+    parser.add_argument("sentences", nargs="*", help="sentences.gz files written by bitextor_split.py")
+    parser.add_argument("--documents", type=int, default=5000, help="Number of generated documents")
+    parser.add_argument("--max-sentences", dest="max_sentences", type=int, default=40,
+                        help="Maximum number of sentences of the generated documents")
+    parser.add_argument("--prune-type", dest="prune_type", choices={"words", "chars"}, default="words")
+    parser.add_argument("--prune", dest="prune_threshold", type=int, default=80)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5, help="Best time of this number of runs is reported")
+    options = parser.parse_args()
+
+    if options.sentences:
+        documents = [document.rstrip("\n").split("\n") for document in read_documents(options.sentences)]
+    else:
+        documents = list(generate_documents(options.documents, options.max_sentences, options.seed))
+    sentences = sum(len(document) for document in documents)
+
+    sentence_filter = SentenceFilter(options.prune_type, options.prune_threshold)
+    for document in documents:
+        if filter_previous(document, options.prune_type, options.prune_threshold) != sentence_filter(document):
+            sys.stderr.write("Outputs differ for document: {}\n".format(repr(document[:5])))
+            sys.exit(1)
+
+    print(f"{len(documents)} documents, {sentences} sentences, outputs are identical")
+    stats = sentence_filter.pop_stats()
+    print("Dropped: " + ", ".join(f"{stats[rule]} {rule}" for rule in RULES))
+
+    for name, function in (
+            ("previous filter", lambda document: filter_previous(document, options.prune_type,
+                                                                 options.prune_threshold)),
+            ("SentenceFilter", sentence_filter)):
+        seconds = bench(function, documents, options.repeat)
+        print(f"{name:>16}: {seconds:.3f}s ({sentences / seconds / 1e6:.2f} M sentences/s)")
+
+
+if __name__ == '__main__':
+    main()
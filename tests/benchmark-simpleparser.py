@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Benchmark of the 'simple' text extractor of warc2preprocess on large HTML documents (e.g. product catalogues), against
+# the previous implementation, which concatenated strings for every tag and chunk of text.
+
+import argparse
+import random
+import sys
+from html.parser import HTMLParser as HTMLTokenizer
+
+from benchmark_common import WORDS, bench
+from bitextor.bitextor_warc2preprocess import SimpleParser
+
+
+class ConcatenatingParser(HTMLTokenizer):
+    startendNL = ["ul", "ol", "dl", "tr", "p", "div", "li", "dd", "dt", "th", "td", "h1", "h2", "h3", "h4", "h5", "h6",
+                  "article", "aside", "blockquote", "details", "summary", "figcaption", "footer", "form", "header",
+                  "legend", "main", "nav", "pre", "section"]
+    selfNL = ["br", "hr"]
+    noText = ["script", "noscript", "style"]
+    lastTok = ""
+    parsed = ""
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.startendNL or tag in self.selfNL:
+            self.parsed = self.parsed + "\n"
+        self.lastTok = tag
+
+    def handle_endtag(self, tag):
+        if tag in self.startendNL:
+            self.parsed = self.parsed + "\n"
+        else:
+            self.parsed = self.parsed + " "
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in self.selfNL:
+            self.parsed = self.parsed + "\n"
+
+    def handle_data(self, data):
+        if self.lastTok not in self.noText:
+            newdata = data.replace("\r\n", " ").replace("\n", " ")
+            self.parsed = self.parsed + newdata
+
+    def get_text(self):
+        return self.parsed.strip() + "\n"
+
+
+def generate_catalogue(size, seed):
+    rng = random.Random(seed)
+    parts = ["<html><head><title>Catalogue</title><style>td { color: red }</style></head><body><table>\n"]
+    length = len(parts[0])
+    item = 0
+    while length < size:
+        item += 1
+        description = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 30)))
+        row = (f'<tr><td><a href="/item/{item}"><img src="/img/{item}.jpg"/>Item {item}</a></td>'
+               f'<td><b>{rng.randint(1, 999)}.99 &euro;</b><br/>{description}</td></tr>\n')
+        parts.append(row)
+        length += len(row)
+    parts.append(f"</table><script>var items = {item};</script></body></html>")
+    return "".join(parts)
+
+
+def extract(parser_class, document):
+    parser = parser_class()
+    parser.feed(document)
+    return parser.get_text()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the 'simple' text extractor of warc2preprocess")
+    parser.add_argument("--sizes", default="100000,1000000,5000000",
+                        help="Comma-separated list of sizes in characters of the generated documents")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=1, help="Best time of this number of runs is reported")
+    options = parser.parse_args()
+
+    for size in map(int, options.sizes.split(",")):
+        document = generate_catalogue(size, options.seed)
+        if extract(SimpleParser, document) != extract(ConcatenatingParser, document):
+            sys.stderr.write(f"Outputs differ for the document of {size} characters\n")
+            sys.exit(1)
+        new_seconds = bench(lambda d: extract(SimpleParser, d), [document], options.repeat)
+        old_seconds = bench(lambda d: extract(ConcatenatingParser, d), [document], options.repeat)
+        print(f"{len(document) / 1e6:.1f} Mchars: concatenation {old_seconds:.2f}s, SimpleParser {new_seconds:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
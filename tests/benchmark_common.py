@@ -0,0 +1,48 @@
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Helpers shared by the benchmark-*.py microbenchmarks: reading documents written by Bitextor, the words of the generated
+# documents and timing.
+
+import base64
+import time
+
+from bitextor.utils.common import open_xz_or_gzip_or_plain
+
+# Words of the generated documents, with some non-ASCII ones
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "àèìòù", "ñandú"]
+
+
+def read_documents(paths):
+    """
+    Documents of files with a base64 document per line, such as plain_text.gz or sentences.gz
+    """
+    for path in paths:
+        with open_xz_or_gzip_or_plain(path) as reader:
+            for line in reader:
+                yield base64.b64decode(line.strip()).decode("utf-8")
+
+
+def bench(function, documents, repeat):
+    """
+    Best time in seconds of repeat runs of function on every document
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for document in documents:
+            function(document)
+        best = min(best, time.perf_counter() - start)
+    return best
@@ -69,6 +69,20 @@ ls "${WORK}/data/warc/clipped/" | grep -v "^greenpeaceaa[.]" | xargs -I{} rm "${
 mv "${WORK}/data/warc/greenpeace.warc.gz" "${WORK}/data/warc/greenpeace.original.warc.gz"
 ln -s "${WORK}/data/warc/clipped/greenpeaceaa.warc.gz" "${WORK}/data/warc/greenpeace.warc.gz"
 
+# Standalone tools (id < 10)
+(
+    ${DIR}/test-crawl.py &> "${WORK}/reports/01-crawl.report"
+    annotate_and_echo_info 01 "$?" "$(cat ${WORK}/reports/01-crawl.report | wc -l)"
+) &
+(
+    ${DIR}/test-boilerplate.py &> "${WORK}/reports/02-boilerplate.report"
+    annotate_and_echo_info 02 "$?" "$(cat ${WORK}/reports/02-boilerplate.report | wc -l)"
+) &
+(
+    ${DIR}/test-persistent-processor.py &> "${WORK}/reports/03-persistent-processor.report"
+    annotate_and_echo_info 03 "$?" "$(cat ${WORK}/reports/03-persistent-processor.report | wc -l)"
+) &
+
 # MT (id >= 10)
 (
     ${BITEXTOR} ${FORCE} --notemp -j ${THREADS} \
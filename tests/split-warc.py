@@ -21,6 +21,8 @@ import sys
 from warcio.archiveiterator import ArchiveIterator
 from warcio.warcwriter import WARCWriter
 
+from bitextor.utils.warcsplit import balanced_cuts, record_cuts, split_file, map_file
+
 A_UPPERCASE = ord('A')
 ALPHABET_SIZE = 26
 
@@ -64,6 +66,8 @@ oparser = argparse.ArgumentParser(
 oparser.add_argument('input', metavar='FILE', help='input WARC', nargs='?', default=sys.stdin)
 oparser.add_argument('prefix', metavar='PREFIX', help='prefix of the file names', nargs='?', default="x")
 oparser.add_argument("-r", "--records", dest="NUMBER", default=1000, help="put NUMBER records per output file")
+oparser.add_argument("-n", "--number", dest="CHUNKS", type=int, default=0,
+                     help="split into CHUNKS files of a similar size instead (only .warc.gz files)")
 oparser.add_argument("-a", "--suffix-length", dest="N", default=2, help="generate suffixes of length N (default 2)")
 oparser.add_argument("--additional-suffix", dest="SUFFIX", default="", help="append an additional SUFFIX to file names")
 oparser.add_argument("-d", dest="decimal", action="store_true", default=False,
@@ -75,10 +79,10 @@ oparser.add_argument("--hex-suffixes", dest="FROMHEX", help="same as -x, but all
 oparser.add_argument("--verbose", action="store_true", default=False,
                      help="print a diagnostic just before each output file is opened")
 options = oparser.parse_args()
-if options.input is not sys.stdin:
-    options.input = open(options.input, 'rb')
-else:
-    options.input = sys.stdin.buffer
+gzipped = options.input is not sys.stdin and options.input[-3:] == ".gz"
+if options.CHUNKS and not gzipped:
+    sys.stderr.write("-n/--number requires a .warc.gz file\n")
+    sys.exit(1)
 
 if options.decimal or options.hex:
     filecounter = 0
@@ -89,22 +93,44 @@ elif options.FROMHEX:
 else:
     filecounter = 1 + (26 * (int(options.N) - 1))
 
+
+def output_name(filecounter):
+    if options.decimal or options.FROM:
+        countersuffix = str(filecounter).zfill(int(options.N))
+    elif options.hex or options.FROMHEX:
+        countersuffix = str(hex(filecounter)[2:]).zfill(int(options.N))
+    else:
+        countersuffix = base_10_to_alphabet(filecounter).lower()
+    name = options.prefix + countersuffix + options.SUFFIX + ".warc.gz"
+    if options.verbose:
+        print("creating file '" + name + "'")
+    return name
+
+
+if gzipped:
+    # cut the file at gzip member (i.e. record) boundaries and copy the byte ranges, without decompressing it
+    with open(options.input, 'rb') as f:
+        data = map_file(f)
+        if options.CHUNKS:
+            ranges = balanced_cuts(data, options.CHUNKS)
+        else:
+            # files of the record by record split had NUMBER + 1 records
+            ranges = record_cuts(data, int(options.NUMBER) + 1)
+    split_file(options.input, ranges, [output_name(filecounter + i) for i in range(len(ranges))])
+    sys.exit(0)
+
+if options.input is not sys.stdin:
+    options.input = open(options.input, 'rb')
+else:
+    options.input = sys.stdin.buffer
+
 counter = 0
 writer = None
 for record in ArchiveIterator(options.input):
     if counter > int(options.NUMBER):
         counter = 0
     if counter == 0:
-        countersuffix = ""
-        if options.decimal or options.FROM:
-            countersuffix = str(filecounter).zfill(int(options.N))
-        elif options.hex or options.FROMHEX:
-            countersuffix = str(hex(filecounter)[2:]).zfill(int(options.N))
-        else:
-            countersuffix = base_10_to_alphabet(filecounter).lower()
-        if options.verbose:
-            print("creating file '" + options.prefix + countersuffix + options.SUFFIX + ".warc.gz" + "'")
-        writer = WARCWriter(open(options.prefix + countersuffix + options.SUFFIX + ".warc.gz", 'wb'), gzip=True)
+        writer = WARCWriter(open(output_name(filecounter), 'wb'), gzip=True)
         filecounter += 1
     writer.write_record(record)
     counter += 1
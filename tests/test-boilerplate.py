@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Test of the density boilerplate remover on a page whose whole body is wrapped in a form, as in ASP.NET sites: the
+# content must be kept and the navigation removed. The exit status is not 0 if it is not.
+
+import sys
+
+from bitextor.utils.boilerplate import DensityRemover
+
+CONTENT = ("The committee approved the new regulation on Tuesday after a long debate in which most of the members "
+           "agreed that the previous rules were no longer adequate for the current situation of the sector, and "
+           "asked the government to publish it as soon as possible.")
+
+PAGE = f"""<html><head><title>News</title><script>var x = 1;</script></head>
+<body><form id="form1" method="post" action="./news.aspx">
+<nav><ul><li><a href="/">Home</a></li><li><a href="/news">News</a></li></ul></nav>
+<div class="links"><a href="/a">Link one</a> <a href="/b">Link two</a> <a href="/c">Link three</a></div>
+<div class="article"><h1>New regulation approved</h1><p>{CONTENT}</p></div>
+<div class="footer"><a href="/contact">Contact</a></div>
+</form></body></html>"""
+
+
+def main():
+    extracted = DensityRemover().extract(PAGE)
+    print(extracted)
+    if CONTENT not in extracted:
+        sys.stderr.write("The content of the form was removed\n")
+        sys.exit(1)
+    if "Link one" in extracted or "var x" in extracted:
+        sys.stderr.write("The boilerplate of the form was not removed\n")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
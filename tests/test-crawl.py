@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Test of bitextor_crawl.py against a local HTTP server: robots.txt is served after a redirection and disallows a
+# directory, a page redirects to another one, and a page has malformed links, which must be skipped without stopping
+# the crawl. The URLs of the WARC written by the crawler are checked, and the exit status is not 0 if they differ.
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from warcio.archiveiterator import ArchiveIterator
+
+CRAWLER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "bitextor", "bitextor_crawl.py")
+
+PAGES = {
+    "/robots.txt": (301, "/robots/current.txt", b""),
+    "/robots/current.txt": (200, None, b"User-agent: *\nDisallow: /private/\n"),
+    "/": (200, None, b'<html><body><a href="/old.html">old</a> <a href="http://[bad/">bad</a> '
+                     b'<a href="http://127.0.0.1:port/">bad port</a> <a href="/private/secret.html">secret</a> '
+                     b'<a href="/malformed.html">malformed</a></body></html>'),
+    "/old.html": (302, "/new.html", b""),
+    "/new.html": (200, None, b"<html><body><p>New</p></body></html>"),
+    "/malformed.html": (200, None, b'<html><body><a href="http://[::1">bad</a> <a href="last.html">last</a>'
+                                   b'</body></html>'),
+    "/last.html": (200, None, b"<html><body><p>Last</p></body></html>"),
+    "/private/secret.html": (200, None, b"<html><body><p>Secret</p></body></html>"),
+}
+
+EXPECTED = ["/", "/old.html", "/malformed.html", "/new.html", "/last.html"]
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in PAGES:
+            self.send_error(404)
+            return
+        status, location, body = PAGES[self.path]
+        self.send_response(status)
+        if location:
+            self.send_header("Location", location)
+        self.send_header("Content-Type", "text/plain" if self.path.endswith(".txt") else "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"127.0.0.1:{server.server_address[1]}"
+
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            subprocess.run([sys.executable, CRAWLER, "--output-dir", folder, "--timeout", "10", "-t", "60", host],
+                           check=True)
+            with open(os.path.join(folder, host, "crawl.warc.gz"), "rb") as f:
+                infos = []
+                urls = []
+                for record in ArchiveIterator(f):
+                    if record.rec_type == "warcinfo":
+                        infos.append(record.content_stream().read())
+                    elif record.rec_type == "response":
+                        urls.append(record.rec_headers.get_header("WARC-Target-URI"))
+    finally:
+        server.shutdown()
+
+    urls = [url[len(f"http://{host}"):] for url in urls]
+    print("\n".join(urls))
+    if urls != EXPECTED:
+        sys.stderr.write(f"Unexpected URLs crawled: {urls}, expected {EXPECTED}\n")
+        sys.exit(1)
+    if len(infos) != 1 or b"check-certificate: yes" not in infos[0]:
+        sys.stderr.write(f"Unexpected warcinfo records: {infos}\n")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+
+#  This file is part of Bitextor.
+#
+#  Bitextor is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  Bitextor is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with Bitextor.  If not, see <https://www.gnu.org/licenses/>.
+
+# Test of PersistentTextProcessor with a command that copies its input: documents with lines equal to the delimiter
+# must keep their number of lines, and the following documents must not be shifted. The exit status is not 0 if they
+# are not.
+
+import sys
+
+from bitextor.utils.common import PersistentTextProcessor, DOCUMENT_DELIMITER, WORD_DOCUMENT_DELIMITER
+
+COPY = [sys.executable, "-c", "import sys\nfor line in sys.stdin: sys.stdout.write(line)"]
+
+
+def main():
+    failed = False
+    for delimiter in (DOCUMENT_DELIMITER, WORD_DOCUMENT_DELIMITER):
+        documents = ["first\nsecond\n", f"before\n{delimiter}\nafter\n", f"{delimiter}\n", f" {delimiter} \nend\n",
+                     "last\n"]
+        expected = ["first\nsecond\n", "before\n\nafter\n", "\n", "\nend\n", "last\n"]
+
+        processor = PersistentTextProcessor(COPY, delimiter=delimiter, timeout=10)
+        try:
+            outputs, error, returncode = processor.process_batch(documents)
+        finally:
+            processor.stop()
+
+        print(f"{delimiter}: {outputs!r}")
+        if returncode != 0 or outputs != expected:
+            sys.stderr.write(f"Unexpected output with the delimiter {delimiter}: {outputs!r} ({error}), "
+                             f"expected {expected!r}\n")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()